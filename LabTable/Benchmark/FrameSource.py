@@ -0,0 +1,97 @@
+import glob
+import os
+import logging
+import cv2
+import numpy as np
+
+# enable logger
+logger = logging.getLogger(__name__)
+
+# image file extensions used for image sequences
+IMAGE_EXTENSIONS = [".png", ".jpg", ".jpeg", ".bmp"]
+
+
+# loads all color frames of a recorded stream into memory so the benchmark does not measure decoding
+# supported are realsense .bag files, .npz archives and image sequences (directory or glob pattern)
+def load_frames(path, max_frames=None):
+
+    if path.endswith(".bag"):
+        frames = load_bag_frames(path, max_frames)
+    elif path.endswith(".npz"):
+        frames = load_npz_frames(path, max_frames)
+    else:
+        frames = load_image_sequence(path, max_frames)
+
+    logger.info("loaded {} frames from {}".format(len(frames), path))
+    return frames
+
+
+# plays a recorded .bag file as fast as possible and returns copies of all color frames
+def load_bag_frames(path, max_frames=None):
+
+    # Used pyrealsense2 on License: Apache 2.0.
+    # only imported here so other sources can be used without a realsense installation
+    import pyrealsense2 as rs
+
+    realsense_config = rs.config()
+    rs.config.enable_device_from_file(realsense_config, path, repeat_playback=False)
+    realsense_config.enable_all_streams()
+
+    pipeline = rs.pipeline()
+    profile = pipeline.start(realsense_config)
+
+    # do not drop frames because of the real time playback
+    playback = profile.get_device().as_playback()
+    playback.set_real_time(False)
+
+    frames = []
+    try:
+        while max_frames is None or len(frames) < max_frames:
+            color_frame = pipeline.wait_for_frames().get_color_frame()
+            if color_frame:
+                frames.append(np.asanyarray(color_frame.get_data()).copy())
+
+    # wait_for_frames raises when the end of the recording is reached
+    except RuntimeError:
+        pass
+
+    finally:
+        pipeline.stop()
+
+    return frames
+
+
+# returns the frames of a .npz archive
+# either one array with all frames (frames x height x width x 3) or one array per frame
+def load_npz_frames(path, max_frames=None):
+
+    archive = np.load(path)
+    arrays = [archive[name] for name in archive.files]
+
+    if len(arrays) == 1 and arrays[0].ndim == 4:
+        frames = list(arrays[0])
+    else:
+        frames = arrays
+
+    return [np.ascontiguousarray(frame, dtype=np.uint8) for frame in frames[:max_frames]]
+
+
+# returns the images of a directory (sorted by name) or of a glob pattern
+def load_image_sequence(path, max_frames=None):
+
+    if os.path.isdir(path):
+        paths = sorted(os.path.join(path, name) for name in os.listdir(path)
+                       if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)
+    else:
+        paths = sorted(glob.glob(path))
+
+    frames = []
+    for image_path in paths[:max_frames]:
+        image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+
+        if image is None:
+            logger.warning("could not read image {}".format(image_path))
+        else:
+            frames.append(image)
+
+    return frames
@@ -0,0 +1,117 @@
+# compares the vectorized hue histogram of the ShapeDetector against the former pixel by pixel implementation
+# start as a module: python -m LabTable.Benchmark.HueBenchmark --candidates 30 --frames 20
+import argparse
+import time
+import cv2
+import numpy as np
+
+from LabTable.BrickDetection.ShapeDetector import ShapeDetector, masks_configuration, \
+    HUE, SATURATION, HIST_SIZE, MIN_SATURATION, MAX_SATURATION
+from LabTable.Model.Brick import BrickColor
+
+# size of the generated test frames
+FRAME_WIDTH = 1280
+FRAME_HEIGHT = 720
+
+# size of the generated bricks in pixel
+BRICK_SIZE = 24
+
+# BGR colors used for the generated bricks
+BRICK_COLORS = [(200, 40, 30), (30, 30, 200), (40, 180, 40), (30, 200, 220), (128, 128, 128)]
+
+
+# former implementation which converts the frame for every contour and walks the bounding box pixel by pixel
+def legacy_find_most_frequent_hue(bbox, frame):
+
+    frame_hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+
+    (left_x, upper_y, width, height) = bbox
+
+    new_width = int(width / 2)
+    new_height = int(height / 2)
+    new_left_x = left_x + int(new_width / 2)
+    new_upper_y = upper_y + int(new_height / 2)
+
+    hue_histogram = np.zeros(HIST_SIZE)
+    max_frequency = 0
+    most_frequent_hue_value = None
+    for x in range(new_width):
+        for y in range(new_height):
+
+            hsv_bbox = frame_hsv[new_upper_y + y, new_left_x + x]
+
+            if MIN_SATURATION <= hsv_bbox[SATURATION] <= MAX_SATURATION:
+
+                hue_histogram[hsv_bbox[HUE]] += 1
+
+                if hue_histogram[hsv_bbox[HUE]] > max_frequency:
+                    max_frequency = hue_histogram[hsv_bbox[HUE]]
+                    most_frequent_hue_value = hsv_bbox[HUE]
+
+    if most_frequent_hue_value is not None:
+        for mask_color, mask_config in masks_configuration.items():
+            for entry in mask_config:
+                if entry[0][HUE] <= most_frequent_hue_value <= entry[1][HUE]:
+                    return mask_color
+
+    return BrickColor.UNKNOWN_COLOR
+
+
+# creates a noisy frame with randomly placed and colored bricks and returns it with the brick bounding boxes
+def create_test_frame(random, candidates_number):
+
+    frame = random.randint(0, 256, (FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8)
+    bboxes = []
+
+    for _ in range(candidates_number):
+        left_x = int(random.randint(0, FRAME_WIDTH - 2 * BRICK_SIZE))
+        upper_y = int(random.randint(0, FRAME_HEIGHT - BRICK_SIZE))
+        width = BRICK_SIZE * int(random.randint(1, 3))
+        color = BRICK_COLORS[random.randint(len(BRICK_COLORS))]
+
+        # add some noise so the hue histogram is not trivial
+        brick = np.full((BRICK_SIZE, width, 3), color, dtype=np.int16)
+        brick += random.randint(-25, 26, brick.shape, dtype=np.int16)
+        frame[upper_y:upper_y + BRICK_SIZE, left_x:left_x + width] = np.clip(brick, 0, 255)
+
+        bboxes.append((left_x, upper_y, width, BRICK_SIZE))
+
+    return frame, bboxes
+
+
+def main():
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--candidates", type=int, default=30, help="number of brick candidates per frame")
+    parser.add_argument("--frames", type=int, default=20, help="number of benchmarked frames")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the generated test frames")
+    arguments = parser.parse_args()
+
+    random = np.random.RandomState(arguments.seed)
+    legacy_time = 0
+    vectorized_time = 0
+    mismatches = 0
+
+    for _ in range(arguments.frames):
+        frame, bboxes = create_test_frame(random, arguments.candidates)
+
+        start = time.perf_counter()
+        legacy_colors = [legacy_find_most_frequent_hue(bbox, frame) for bbox in bboxes]
+        legacy_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        frame_hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        vectorized_colors = [ShapeDetector.find_most_frequent_hue(bbox, frame_hsv) for bbox in bboxes]
+        vectorized_time += time.perf_counter() - start
+
+        mismatches += sum(legacy != vectorized for legacy, vectorized in zip(legacy_colors, vectorized_colors))
+
+    print("candidates per frame: {}, frames: {}".format(arguments.candidates, arguments.frames))
+    print("legacy:     {:8.2f} ms/frame".format(1000 * legacy_time / arguments.frames))
+    print("vectorized: {:8.2f} ms/frame".format(1000 * vectorized_time / arguments.frames))
+    print("speedup:    {:8.1f}x".format(legacy_time / vectorized_time))
+    print("mismatching colors: {}".format(mismatches))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+import logging
+from itertools import count
+
+from LabTable.Model.Brick import Brick
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+# OfflineCommunicator class
+# stands in for the Communicator when benchmarking without a server
+# remote instances are only counted and get consecutive assetpos ids
+class OfflineCommunicator:
+
+    def __init__(self):
+        self.assetpos_ids = count(1)
+        self.brick_update_callback = lambda: None
+
+        self.created_instances_number = 0
+        self.removed_instances_number = 0
+
+    def create_remote_brick_instance(self, brick: Brick):
+        brick.assetpos_id = next(self.assetpos_ids)
+        self.created_instances_number += 1
+
+    def remove_remote_brick_instance(self, brick: Brick):
+        self.removed_instances_number += 1
+
+    def get_stored_brick_instances(self, asset_id):
+        return []
+
+    def get_all_stored_brick_instances(self, asset_ids):
+        return []
+
+    def get_brick_instance_changes(self, asset_ids):
+        return [], [], False
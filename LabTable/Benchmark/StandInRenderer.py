@@ -0,0 +1,136 @@
+# stands in for the QGIS plugin: answers render requests of the table with generated maps
+# the maps are handed over with the transport configured in qgis_interaction (png files or the shared map file)
+# start as a module: python -m LabTable.Benchmark.StandInRenderer --config config.json
+import argparse
+import logging
+import socket
+import time
+import cv2
+import numpy as np
+
+from LabTable.Configurator import Configurator
+from LabTable.Model.Extent import Extent
+from LabTable.TableUI.MapHandler import MAP_TRANSPORT_SHARED_MEMORY
+from LabTable.TableUI.SharedMapBuffer import SharedMapBuffer
+
+logger = logging.getLogger(__name__)
+
+# distance between the grid lines of the generated maps in map units
+GRID_SPACING = 1000
+
+# width of the transparent border of the generated maps in pixel, so the table has to flatten the renders
+TRANSPARENT_BORDER = 8
+
+
+# StandInRenderer class
+# renders a grid in map coordinates for every requested extent, so panning and zooming is visible on the table
+class StandInRenderer:
+
+    def __init__(self, config: Configurator):
+
+        self.config = config
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        qgis_ip = config.get('qgis_interaction', 'qgis_ip')
+        self.sock.bind((qgis_ip, config.get('qgis_interaction', 'qgis_read_port')))
+        self.table_addr = (qgis_ip, config.get('qgis_interaction', 'table_read_port'))
+
+        self.render_keyword = config.get('qgis_interaction', 'render_keyword')
+        self.update_keyword = config.get('qgis_interaction', 'update_keyword')
+        self.exit_keyword = config.get('qgis_interaction', 'exit_keyword')
+        self.image_path = config.get('qgis_interaction', 'qgis_image_path')
+
+        self.shared_memory = config.get('qgis_interaction', 'map_transport') == MAP_TRANSPORT_SHARED_MEMORY
+        self.shared_map_path = config.get('qgis_interaction', 'shared_map_path')
+        self.shared_map_buffers = {}
+
+    # answers render requests until the exit keyword is received
+    def run(self):
+        logger.info("waiting for render requests")
+
+        while True:
+            data, addr = self.sock.recvfrom(1024)
+            data = data.decode()
+
+            if data == self.exit_keyword:
+                break
+
+            if data.startswith(self.render_keyword):
+                # format: {keyword}{target_name} {required_resolution} {crs} {extent0} ... {extent3}
+                info = data[len(self.render_keyword):].split(' ')
+                target_name, resolution = info[0], int(info[1])
+                extent = Extent(*[float(value) for value in info[3:7]], True)
+
+                start = time.perf_counter()
+                self.hand_over(target_name, StandInRenderer.render(extent, resolution), extent)
+                logger.info("rendered {} in {:.1f} ms".format(target_name, 1000 * (time.perf_counter() - start)))
+
+        self.sock.close()
+        for shared_map_buffer in self.shared_map_buffers.values():
+            shared_map_buffer.close()
+
+    # writes the render with the configured transport and notifies the table
+    def hand_over(self, target_name, image, extent: Extent):
+
+        if self.shared_memory:
+            if target_name not in self.shared_map_buffers:
+                self.shared_map_buffers[target_name] = SharedMapBuffer(self.shared_map_path.format(target_name))
+            self.shared_map_buffers[target_name].write(image, extent)
+        else:
+            cv2.imwrite(self.image_path.format(target_name), image)
+
+        self.sock.sendto('{keyword}{target_name} {extent0} {extent1} {extent2} {extent3}'.format(
+            keyword=self.update_keyword, target_name=target_name,
+            extent0=extent.x_min, extent1=extent.y_min, extent2=extent.x_max, extent3=extent.y_max
+        ).encode(), self.table_addr)
+
+    # renders a BGRA grid for the given extent with the given width and the height fitting the extent ratio
+    @staticmethod
+    def render(extent: Extent, resolution: int):
+
+        width = resolution
+        height = max(1, int(round(resolution * extent.get_height() / extent.get_width())))
+
+        # background gradient depending on the position, so distinct extents look distinct
+        x = np.linspace(extent.x_min, extent.x_max, width)
+        y = np.linspace(extent.y_max, extent.y_min, height)
+        image = np.empty((height, width, 4), np.uint8)
+        image[:, :, 0] = (np.abs(x) / GRID_SPACING * 16 % 256).astype(np.uint8)
+        image[:, :, 1] = (np.abs(y) / GRID_SPACING * 16 % 256).astype(np.uint8)[:, np.newaxis]
+        image[:, :, 2] = 160
+        image[:, :, 3] = 255
+
+        # grid lines in map coordinates
+        for grid_x in np.arange(np.ceil(extent.x_min / GRID_SPACING), np.floor(extent.x_max / GRID_SPACING) + 1):
+            column = int((grid_x * GRID_SPACING - extent.x_min) / extent.get_width() * (width - 1))
+            cv2.line(image, (column, 0), (column, height - 1), (40, 40, 40, 255), 1)
+
+        for grid_y in np.arange(np.ceil(extent.y_min / GRID_SPACING), np.floor(extent.y_max / GRID_SPACING) + 1):
+            row = int((extent.y_max - grid_y * GRID_SPACING) / extent.get_height() * (height - 1))
+            cv2.line(image, (0, row), (width - 1, row), (40, 40, 40, 255), 1)
+
+        image[:TRANSPARENT_BORDER, :, 3] = 0
+        image[-TRANSPARENT_BORDER:, :, 3] = 0
+
+        return image
+
+
+def main():
+
+    parser = argparse.ArgumentParser(prog="python -m LabTable.Benchmark.StandInRenderer")
+    parser.add_argument("--config", default="config.json", help="path of the config file")
+    parser.add_argument("--transport", choices=["png", MAP_TRANSPORT_SHARED_MEMORY],
+                        help="overrides the configured map transport")
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    config = Configurator(arguments.config)
+    if arguments.transport:
+        config.set('qgis_interaction', 'map_transport', arguments.transport)
+
+    StandInRenderer(config).run()
+
+
+if __name__ == '__main__':
+    main()
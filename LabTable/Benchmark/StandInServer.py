@@ -0,0 +1,217 @@
+# stands in for the landscapelab server: answers the websocket messages of the Communicator
+# remote brick instances are only kept in memory, configure server.ssl_pem_file as null to connect without ssl
+# start as a module: python -m LabTable.Benchmark.StandInServer --port 8080
+import argparse
+import asyncio
+import json
+import logging
+from itertools import count
+import websockets
+
+from LabTable.Communicator import CREATE_ASSET_MSG, UPDATE_ASSET_MSG, REMOVE_ASSET_MSG, ANSWER_STRING, \
+    ASSETPOS_ID_STRING, SUCCESS_ANSWER, FAILURE_ANSWER, GET_SCENARIO_INFO, GET_INSTANCES, BATCH_ASSET_MSG, \
+    BATCH_RESULTS_STRING, CHANGES_ASSET_MSG, SYNC_TOKEN_STRING, CHANGED_STRING, REMOVED_STRING, COMPLETE_STRING, \
+    NO_SYNC_TOKEN, GET_ENERGY_TARGET, GET_ENERGY_CONTRIBUTION
+from LabTable.WebsocketSession import REQUEST_ID_KEY, MESSAGE_KEY
+
+logger = logging.getLogger(__name__)
+
+# the scenario the table finds on startup, its location is in the same crs as the map renders
+SCENARIO_ID = "1"
+SCENARIO_LOCATION = [1725000.0, 6024000.0]
+
+# energy target of every asset type and contribution of every stored asset
+ENERGY_TARGET = 100
+ENERGY_PER_ASSET = 10
+
+
+# StandInServer class
+# keeps the created asset positions and answers every request, in the envelope of the WebsocketSession if it has one
+# an optional delay simulates the latency of the real server
+# batch messages and change tokens can be turned off to test servers which do not support them
+class StandInServer:
+
+    def __init__(self, delay: float = 0, batch_messages: bool = True, delta_sync: bool = True,
+                 scenario_name: str = "Joglland"):
+        self.delay = delay
+        self.scenario_name = scenario_name
+        self.batch_messages = batch_messages
+        self.delta_sync = delta_sync
+
+        self.assetpos_ids = count(1)
+        self.asset_positions = {}
+
+        # the change number of every asset position changed so far, removed ones are kept with position None
+        # the current change number is the sync token
+        self.change_numbers = count(1)
+        self.sync_token = 0
+        self.asset_changes = {}
+
+        self.connections_number = 0
+        self.messages_number = 0
+        self.batch_number = 0
+
+    # answers the messages of one connection until it is closed
+    async def handle_connection(self, websocket, path=None):
+
+        self.connections_number += 1
+        logger.info("client connected ({} connections so far)".format(self.connections_number))
+
+        # all requests are handled concurrently, but bare messages are answered in the order they arrived
+        previous_answer = None
+        async for raw_request in websocket:
+
+            request = StandInServer.read_envelope(raw_request)
+            if request is not None:
+                asyncio.ensure_future(self.answer(websocket, request[MESSAGE_KEY], request[REQUEST_ID_KEY]))
+            else:
+                previous_answer = asyncio.ensure_future(
+                    self.answer(websocket, raw_request, previous_answer=previous_answer))
+
+    # returns the request if the message is wrapped in the envelope of the WebsocketSession, otherwise None
+    @staticmethod
+    def read_envelope(raw_request: str):
+
+        try:
+            request = json.loads(raw_request)
+        except ValueError:
+            return None
+
+        if isinstance(request, dict) and MESSAGE_KEY in request and REQUEST_ID_KEY in request:
+            return request
+        return None
+
+    # answers a message, with a request id the answer is wrapped in the envelope
+    # the answer is sent after the previous answer was sent
+    async def answer(self, websocket, message: str, request_id=None, previous_answer=None):
+
+        self.messages_number += 1
+
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+        answer = self.handle_message(message)
+        if request_id is not None:
+            answer[REQUEST_ID_KEY] = request_id
+
+        if previous_answer is not None:
+            await previous_answer
+
+        try:
+            await websocket.send(json.dumps(answer))
+        except websockets.exceptions.ConnectionClosed:
+            logger.warning("could not answer {}, the connection is closed".format(message))
+
+    # returns the answer to a message of the Communicator protocol
+    def handle_message(self, message: str):
+
+        command, *arguments = message.split(' ')
+
+        if command == BATCH_ASSET_MSG.split(' ')[0] and self.batch_messages:
+            batch = json.loads(message[len(command) + 1:])
+            self.batch_number += 1
+            return {ANSWER_STRING: SUCCESS_ANSWER,
+                    BATCH_RESULTS_STRING: [self.handle_message(batch_message) for batch_message in batch]}
+
+        if command == CREATE_ASSET_MSG.split(' ')[0]:
+            asset_id, x, y = arguments
+            assetpos_id = next(self.assetpos_ids)
+            self.asset_positions[assetpos_id] = (int(asset_id), float(x), float(y))
+            self.add_change(assetpos_id)
+            return {ANSWER_STRING: SUCCESS_ANSWER, ASSETPOS_ID_STRING: assetpos_id}
+
+        if command == UPDATE_ASSET_MSG.split(' ')[0]:
+            assetpos_id, x, y = arguments
+            if int(assetpos_id) not in self.asset_positions:
+                return {ANSWER_STRING: FAILURE_ANSWER}
+
+            asset_id = self.asset_positions[int(assetpos_id)][0]
+            self.asset_positions[int(assetpos_id)] = (asset_id, float(x), float(y))
+            self.add_change(int(assetpos_id))
+            return {ANSWER_STRING: SUCCESS_ANSWER}
+
+        if command == REMOVE_ASSET_MSG.split(' ')[0]:
+            if self.asset_positions.pop(int(arguments[0]), None) is None:
+                return {ANSWER_STRING: FAILURE_ANSWER}
+            self.add_change(int(arguments[0]))
+            return {ANSWER_STRING: SUCCESS_ANSWER}
+
+        if command == CHANGES_ASSET_MSG.split(' ')[0] and self.delta_sync:
+            sync_token, asset_ids = arguments
+            return self.get_changes(int(sync_token), {int(asset_id) for asset_id in asset_ids.split(',')})
+
+        if command.startswith(GET_INSTANCES):
+            asset_id = int(''.join(character for character in command[len(GET_INSTANCES):] if character.isdigit()))
+            return {"assets": {str(assetpos_id): {"position": [x, y]}
+                               for assetpos_id, (stored_asset_id, x, y) in self.asset_positions.items()
+                               if stored_asset_id == asset_id}}
+
+        if command == GET_SCENARIO_INFO:
+            return {SCENARIO_ID: {"name": self.scenario_name, "locations": {
+                "1": {"name": "center", "location": SCENARIO_LOCATION, "starting_location": True}}}}
+
+        # format: {command}{scenario_id}/{asset_type_id}.json
+        if command.startswith(GET_ENERGY_TARGET):
+            return {"energy_target": ENERGY_TARGET}
+
+        if command.startswith(GET_ENERGY_CONTRIBUTION):
+            asset_id = int(command[len(GET_ENERGY_CONTRIBUTION):].split('/')[1].split('.')[0])
+            assets_number = sum(stored_asset_id == asset_id for stored_asset_id, x, y in self.asset_positions.values())
+            return {"total_energy_contribution": ENERGY_PER_ASSET * assets_number}
+
+        logger.warning("unknown message: {}".format(message))
+        return {ANSWER_STRING: FAILURE_ANSWER}
+
+    # records that the asset position was created, moved or removed
+    def add_change(self, assetpos_id: int):
+        self.sync_token = next(self.change_numbers)
+        self.asset_changes[assetpos_id] = (self.sync_token, self.asset_positions.get(assetpos_id))
+
+    # returns the asset positions of the given assets which changed after the sync token
+    # the first request gets all of them
+    def get_changes(self, sync_token: int, asset_ids):
+
+        changed = {}
+        removed = []
+        for assetpos_id, (change_number, asset_position) in self.asset_changes.items():
+            if change_number <= sync_token:
+                continue
+
+            if asset_position is None:
+                removed.append(str(assetpos_id))
+            elif asset_position[0] in asset_ids:
+                changed[str(assetpos_id)] = {"asset_id": asset_position[0], "position": list(asset_position[1:])}
+
+        return {SYNC_TOKEN_STRING: str(self.sync_token), CHANGED_STRING: changed, REMOVED_STRING: removed,
+                COMPLETE_STRING: str(sync_token) == NO_SYNC_TOKEN}
+
+    async def serve(self, host: str, port: int):
+        async with websockets.serve(self.handle_connection, host, port):
+            logger.info("listening on ws://{}:{}".format(host, port))
+            await asyncio.Future()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(prog="python -m LabTable.Benchmark.StandInServer")
+    parser.add_argument("--host", default="127.0.0.1", help="address the server listens on")
+    parser.add_argument("--port", type=int, default=8080, help="port the server listens on")
+    parser.add_argument("--delay", type=float, default=0, help="seconds every answer is delayed")
+    parser.add_argument("--no-batch", action="store_true", help="answer batch messages like unknown messages")
+    parser.add_argument("--scenario", default="Joglland", help="name of the only scenario (general.scenario)")
+    parser.add_argument("--no-delta-sync", action="store_true", help="answer changes requests like unknown messages")
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        server = StandInServer(arguments.delay, not arguments.no_batch, not arguments.no_delta_sync, arguments.scenario)
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.serve(arguments.host, arguments.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+# headless benchmark of the brick detection hot path
+# feeds recorded frames through BoardDetector, ShapeDetector and Tracker without windows, server or QGIS
+# start as a module: python -m LabTable.Benchmark --frames stream.bag
+import argparse
+import csv
+import logging
+import time
+from collections import OrderedDict
+import numpy as np
+
+from LabTable.Configurator import Configurator
+from LabTable.ExtentTracker import ExtentTracker
+from LabTable.Model.Extent import Extent
+from LabTable.Model.ProgramStage import ProgramStage
+from LabTable.BrickDetection.BoardDetector import BoardDetector
+from LabTable.BrickDetection.ShapeDetector import ShapeDetector
+from LabTable.BrickDetection.FramePreprocessing import FramePreprocessing
+from LabTable.BrickDetection.Tracker import Tracker
+from LabTable.TableUI.UIElements.UIElement import UIElement
+from .FrameSource import load_frames
+from .OfflineCommunicator import OfflineCommunicator
+
+# configure logging
+logger = logging.getLogger(__name__)
+
+# reported latency percentiles
+PERCENTILES = [50, 90, 99]
+
+# default distance from the camera to the board (in depth units, millimeters for the realsense)
+DEFAULT_BOARD_DISTANCE = 1000
+
+# distance of the default board corners to the frame borders
+# (board corners on the frame border are rejected by BoardDetector.rectify_image)
+CORNER_MARGIN = 1
+
+
+# runs the detection hot path of LabTable.do_brick_detection on given frames and measures every stage
+class DetectionBenchmark:
+
+    STAGES = ["rectify", "preprocessing", "classification", "tracker"]
+
+    def __init__(self, config, corners, board_distance, program_stage: ProgramStage):
+
+        self.program_stage = program_stage
+
+        self.board_detector = BoardDetector(config, config.get("qr_code", "threshold"))
+        self.board = self.board_detector.board
+        self.board.corners = corners
+
+        # the extents are normally set by the output stream and the map handler
+        extent_tracker = ExtentTracker.get_instance()
+        extent_tracker.beamer = Extent(0, 0, config.get("beamer_resolution", "width"),
+                                       config.get("beamer_resolution", "height"))
+        extent_tracker.map_extent = Extent(0, 0, 1, 1, True)
+
+        self.shape_detector = ShapeDetector(config, None)
+        self.shape_detector.calculate_possible_brick_dimensions(board_distance)
+        self.frame_preprocessing = FramePreprocessing()
+
+        self.communicator = OfflineCommunicator()
+        self.tracker = Tracker(config, self.board, self.communicator, UIElement())
+
+        self.region_of_interest = np.zeros((config.get("resolution", "height"),
+                                            config.get("resolution", "width"), 3), np.uint8)
+
+        # measured milliseconds per stage and frame
+        self.timings = OrderedDict((stage, []) for stage in DetectionBenchmark.STAGES + ["total"])
+
+    # processes one frame and records the time every stage took
+    def process(self, color_image):
+
+        stage_times = [time.perf_counter()]
+
+        region_of_interest = self.board_detector.rectify_image(self.region_of_interest, color_image)
+        stage_times.append(time.perf_counter())
+
+        self.frame_preprocessing.update(region_of_interest)
+        stage_times.append(time.perf_counter())
+
+        potential_bricks_list = []
+        for contour_index in range(len(self.frame_preprocessing.contours)):
+            brick_candidate = self.shape_detector.detect_brick(contour_index, self.frame_preprocessing)
+            if brick_candidate:
+                potential_bricks_list.append(brick_candidate)
+        stage_times.append(time.perf_counter())
+
+        self.tracker.update(potential_bricks_list, self.program_stage)
+        stage_times.append(time.perf_counter())
+
+        for stage, start, end in zip(DetectionBenchmark.STAGES, stage_times, stage_times[1:]):
+            self.timings[stage].append(1000 * (end - start))
+        self.timings["total"].append(1000 * (stage_times[-1] - stage_times[0]))
+
+    # drops all recorded timings (e.g. after warm up frames)
+    def reset_timings(self):
+        for stage_timings in self.timings.values():
+            stage_timings.clear()
+
+    # prints latency percentiles of every stage and the end-to-end frame rate
+    def report(self):
+
+        print("{:<16}".format("stage [ms]") + "".join("{:>10}".format("p{}".format(p)) for p in PERCENTILES)
+              + "{:>10}{:>10}".format("mean", "max"))
+
+        for stage, stage_timings in self.timings.items():
+            values = np.array(stage_timings)
+            print("{:<16}".format(stage) + "".join("{:>10.2f}".format(v) for v in np.percentile(values, PERCENTILES))
+                  + "{:>10.2f}{:>10.2f}".format(values.mean(), values.max()))
+
+        total = np.array(self.timings["total"])
+        print("frames: {}, end-to-end: {:.1f} fps".format(len(total), 1000 * len(total) / total.sum()))
+        print("confirmed bricks: {}, tracked candidates: {}, created instances: {}, removed instances: {}".format(
+            len(self.tracker.confirmed_bricks), len(self.tracker.tracked_candidates),
+            self.communicator.created_instances_number, self.communicator.removed_instances_number))
+
+    # writes the timings of every frame to a csv file
+    def write_csv(self, path):
+
+        with open(path, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["frame"] + list(self.timings.keys()))
+            for frame_number, row in enumerate(zip(*self.timings.values())):
+                writer.writerow([frame_number] + ["{:.3f}".format(value) for value in row])
+
+
+# parses the board corners "x,y x,y x,y x,y" (top left, top right, bottom right, bottom left)
+def parse_corners(corners_string):
+    return [[int(value) for value in corner.split(",")] for corner in corners_string.split()]
+
+
+def main():
+
+    parser = argparse.ArgumentParser(prog="python -m LabTable.Benchmark")
+    parser.add_argument("--frames", required=True,
+                        help="recorded frames: .bag file, .npz archive, image directory or glob pattern")
+    parser.add_argument("--config", default="config.json", help="path of the config file")
+    parser.add_argument("--corners", type=parse_corners,
+                        help="board corners 'x,y x,y x,y x,y' (top left, top right, bottom right, bottom left), "
+                             "defaults to the whole frame")
+    parser.add_argument("--distance", type=float, default=DEFAULT_BOARD_DISTANCE,
+                        help="distance from the camera to the board used for the possible brick sizes")
+    parser.add_argument("--stage", choices=["EVALUATION", "PLANNING"], default="PLANNING",
+                        help="program stage the tracker is updated with")
+    parser.add_argument("--rectification", choices=["warp", "remap"],
+                        help="rectification mode, defaults to the configured one")
+    parser.add_argument("--max-frames", type=int, help="maximum number of loaded frames")
+    parser.add_argument("--repeat", type=int, default=1, help="how often the frames are processed")
+    parser.add_argument("--warmup", type=int, default=5, help="number of frames excluded from the results")
+    parser.add_argument("--csv", help="optional csv file for the timings of every frame")
+    arguments = parser.parse_args()
+
+    # detection modules log every contour on debug level
+    logging.basicConfig(level=logging.WARNING)
+
+    config = Configurator(arguments.config)
+    frames = load_frames(arguments.frames, arguments.max_frames)
+    if not frames:
+        raise ValueError("No frames found in {}".format(arguments.frames))
+
+    # frames have to fit the configured resolution, since the region of interest is allocated with it
+    height, width = frames[0].shape[:2]
+    config.set("resolution", "width", width)
+    config.set("resolution", "height", height)
+
+    if arguments.rectification:
+        config.set("rectification", "mode", arguments.rectification)
+
+    corners = arguments.corners
+    if corners is None:
+        corners = [[CORNER_MARGIN, CORNER_MARGIN], [width - CORNER_MARGIN - 1, CORNER_MARGIN],
+                   [width - CORNER_MARGIN - 1, height - CORNER_MARGIN - 1],
+                   [CORNER_MARGIN, height - CORNER_MARGIN - 1]]
+
+    benchmark = DetectionBenchmark(config, corners, arguments.distance, ProgramStage[arguments.stage])
+
+    processed_frames_number = 0
+    for _ in range(arguments.repeat):
+        for frame in frames:
+            benchmark.process(frame)
+
+            processed_frames_number += 1
+            if processed_frames_number == arguments.warmup:
+                benchmark.reset_timings()
+
+    if processed_frames_number <= arguments.warmup:
+        raise ValueError("Not enough frames processed for {} warm up frames".format(arguments.warmup))
+
+    benchmark.report()
+
+    if arguments.csv:
+        benchmark.write_csv(arguments.csv)
+
+
+if __name__ == '__main__':
+    main()
@@ -36,6 +36,12 @@ MAX_FRAMES_NUMBER = 20
 THRESHOLD_STEP = 16
 MAX_THRESHOLD = 255
 
+# Rectification modes
+# WARP: warp the frame into the board area of a region of interest with the camera resolution
+# REMAP: use precomputed remap tables and output only the board area
+RECTIFICATION_MODE_WARP = "warp"
+RECTIFICATION_MODE_REMAP = "remap"
+
 
 # this class manages the extent to detect and reference the extent of
 # the board related to the video stream
@@ -67,6 +73,21 @@ class BoardDetector:
 
         self.detect_corners_frames_number = 0
 
+        # perspective transform matrix of the board corners it was computed for
+        # it is only recomputed if the corners change (in FIND_CORNERS)
+        self.perspective_matrix = None
+        self.perspective_corners = None
+
+        # the region of interest buffer which was already set to black
+        self.cleared_region_of_interest = None
+
+        # in remap mode the frame pixel positions of every board pixel are precomputed
+        # and the board is written into an own buffer with the board size
+        self.rectification_mode = self.config.get("rectification", "mode")
+        self.remap_x = None
+        self.remap_y = None
+        self.board_image = None
+
     # Compute pythagoras value
     @staticmethod
     def pythagoras(value_x, value_y):
@@ -274,6 +295,9 @@ class BoardDetector:
 
             self.board.corners = [top_left_corner, top_right_corner, bottom_right_corner, bottom_left_corner]
             logger.debug("board_corners: {}".format(self.board.corners))
+
+            # the transform matrix only changes with the corners, so it is computed once here
+            self.compute_perspective_transform(self.board.corners)
             all_board_corners_found = True
 
         return all_board_corners_found
@@ -291,15 +315,11 @@ class BoardDetector:
             # y.append(corner[0])
         return min(x), min(y), max(x), max(y)
 
-    # Wrap the frame perspective to a top-down view (rectangle)
-    def rectify(self, image, corners):
+    # Compute the perspective transform matrix which maps the board corners to a top-down view
+    def compute_perspective_transform(self, corners):
 
         # Save given corners in a numpy array
-        source_corners = np.zeros((4, 2), dtype="float32")
-        source_corners[0] = corners[0]
-        source_corners[1] = corners[1]
-        source_corners[2] = corners[2]
-        source_corners[3] = corners[3]
+        source_corners = np.array(corners, dtype="float32")
 
         # If not done yet, compute width and height of the board
         if self.board.width == 1:
@@ -315,8 +335,41 @@ class BoardDetector:
             [0, self.board.height - 1]], dtype="float32")
 
         # Calculate the perspective transform matrix
-        matrix = cv2.getPerspectiveTransform(source_corners, destination_corners)
-        rectified_image = cv2.warpPerspective(image, matrix, (self.board.width, self.board.height))
+        self.perspective_matrix = cv2.getPerspectiveTransform(source_corners, destination_corners)
+        self.perspective_corners = [list(corner) for corner in corners]
+
+        if self.rectification_mode == RECTIFICATION_MODE_REMAP:
+            self.compute_remap_tables()
+
+    # Compute for every board pixel the position in the frame it is taken from
+    def compute_remap_tables(self):
+
+        # All pixel positions of the board
+        board_x, board_y = np.meshgrid(np.arange(self.board.width, dtype=np.float32),
+                                       np.arange(self.board.height, dtype=np.float32))
+        board_points = np.dstack((board_x, board_y))
+
+        # Map them back into the frame with the inverse transform
+        frame_points = cv2.perspectiveTransform(board_points, np.linalg.inv(self.perspective_matrix))
+
+        # Keep the float maps, the fixed-point ones (cv2.CV_16SC2) are a bit faster
+        # but differ from warpPerspective by several gray levels which the color thresholds were not tuned for
+        self.remap_x = np.ascontiguousarray(frame_points[:, :, 0])
+        self.remap_y = np.ascontiguousarray(frame_points[:, :, 1])
+
+    # Wrap the frame perspective to a top-down view (rectangle)
+    # if dst is given, the rectified image is written into it (it has to be of the board size)
+    def rectify(self, image, corners, dst=None):
+
+        # The matrix is only computed again if the corners changed
+        if self.perspective_matrix is None or self.perspective_corners != [list(corner) for corner in corners]:
+            self.compute_perspective_transform(corners)
+
+        if self.rectification_mode == RECTIFICATION_MODE_REMAP:
+            rectified_image = cv2.remap(image, self.remap_x, self.remap_y, cv2.INTER_LINEAR, dst=dst)
+        else:
+            rectified_image = cv2.warpPerspective(image, self.perspective_matrix,
+                                                  (self.board.width, self.board.height), dst=dst)
 
         return rectified_image
 
@@ -355,20 +408,44 @@ class BoardDetector:
                 cv2.line(frame, hull[j], hull[(j + 1) % n], (255, 0, 0), 3)
 
     # Compute region of interest (board area) from the color image
+    # in remap mode the returned region of interest has the board size
+    # and the given region of interest is only returned as long as no board was rectified
     def rectify_image(self, region_of_interest, color_image):
 
         # Check if found QR-code markers positions are included in the frame size
         if all([0, 0] < corners < [color_image.shape[1], color_image.shape[0]]
                for corners in self.board.corners):
 
-            # Eliminate perspective transformations and show only the board
-            rectified_image = self.rectify(color_image, self.board.corners)
+            if self.rectification_mode == RECTIFICATION_MODE_REMAP:
+
+                # Write only the board into the reused board buffer (allocated by the first call)
+                # so no black padding has to be processed
+                self.board_image = self.rectify(color_image, self.board.corners, self.board_image)
+                return self.board_image
+
+            # Set ROI to black only once, the board area is overwritten in every frame
+            # and the board size does not change after it was computed
+            if region_of_interest is not self.cleared_region_of_interest:
+                region_of_interest[0:self.frame_height, 0:self.frame_width] = [0, 0, 0]
+                self.cleared_region_of_interest = region_of_interest
+
+            # Eliminate perspective transformations and write only the board directly into the ROI
+            # where objects are searched
+            # OpenCV allocates a new image instead if the ROI is smaller than the board or cannot be written into,
+            # then the rectified board is copied into the ROI
+            board_region = region_of_interest[0:self.board.height, 0:self.board.width]
+            if board_region.shape[:2] == (self.board.height, self.board.width):
+                rectified_image = self.rectify(color_image, self.board.corners, board_region)
+            else:
+                rectified_image = self.rectify(color_image, self.board.corners)
+
+            if rectified_image is not board_region and not np.shares_memory(rectified_image, board_region):
+                board_region[...] = rectified_image[0:board_region.shape[0], 0:board_region.shape[1]]
             # TODO: use clipped color image
             # rectified_image =  self.board_detector.rectify(clipped_color_image, board_corners)
 
-            # Set ROI to black and add only the rectified board, where objects are searched
-            region_of_interest[0:self.frame_height, 0:self.frame_width] = [0, 0, 0]
-            region_of_interest[0:self.board.height, 0:self.board.width] = rectified_image
+        elif self.board_image is not None:
+            return self.board_image
 
         return region_of_interest
 
@@ -0,0 +1,147 @@
+import math
+from typing import Dict, List, Optional, Tuple
+
+from LabTable.Model.Brick import Brick
+
+
+# BrickIndex class
+# an insertion ordered collection of bricks (used like a list by the tracker and the output stream)
+# which is additionally indexed by the brick values and by a uniform grid over the brick centroids
+# so membership tests, removals and neighbour lookups do not have to scan all bricks
+#
+# the bricks are indexed by their position when they are added,
+# if the centroid of a contained brick is changed update_position has to be called
+class BrickIndex:
+
+    def __init__(self, cell_size):
+
+        # the edge length of a grid cell, neighbour lookups within this distance only check the adjacent cells
+        self.cell_size = max(1, cell_size)
+
+        # insertion ordered entries by brick object id: [brick, sequence number, value key, cell]
+        self.__entries: Dict[int, list] = {}
+
+        # brick object ids by value key (the values Brick.__eq__ compares)
+        self.__values: Dict[Tuple, List[int]] = {}
+
+        # brick object ids by grid cell
+        self.__cells: Dict[Tuple[int, int], Dict[int, None]] = {}
+
+        self.__sequence = 0
+
+    # returns the values two bricks are compared by
+    @staticmethod
+    def get_value_key(brick: Brick) -> Tuple:
+        return brick.centroid_x, brick.centroid_y, brick.color, brick.shape
+
+    # returns the grid cell of the brick centroid
+    def get_cell(self, brick: Brick) -> Tuple[int, int]:
+        return math.floor(brick.centroid_x / self.cell_size), math.floor(brick.centroid_y / self.cell_size)
+
+    # adds a brick at the end
+    def append(self, brick: Brick):
+
+        brick_id = id(brick)
+        if brick_id in self.__entries:
+            raise ValueError("Brick is already in the index: {}".format(brick))
+
+        self.__sequence += 1
+        self.__entries[brick_id] = [brick, self.__sequence, None, None]
+        self.__insert_keys(brick_id)
+
+    # removes the given brick or if it is not contained the first brick which is equal to it
+    def remove(self, brick: Brick):
+
+        brick_id = id(brick)
+        if brick_id not in self.__entries:
+
+            equal_brick_ids = self.__values.get(BrickIndex.get_value_key(brick))
+            if not equal_brick_ids:
+                raise ValueError("Brick is not in the index: {}".format(brick))
+
+            brick_id = min(equal_brick_ids, key=lambda equal_brick_id: self.__entries[equal_brick_id][1])
+
+        self.__remove_keys(brick_id)
+        del self.__entries[brick_id]
+
+    # reindexes a contained brick after its centroid changed
+    def update_position(self, brick: Brick):
+
+        brick_id = id(brick)
+        self.__remove_keys(brick_id)
+        self.__insert_keys(brick_id)
+
+    # returns the first added brick within the given distance in both dimensions (default: cell size)
+    def find_neighbour(self, brick: Brick, distance=None) -> Optional[Brick]:
+
+        if distance is None:
+            distance = self.cell_size
+
+        # number of cells around the cell of the brick which can hold neighbours
+        reach = math.ceil(distance / self.cell_size)
+        cell_x, cell_y = self.get_cell(brick)
+
+        neighbour_entry = None
+        for x in range(cell_x - reach, cell_x + reach + 1):
+            for y in range(cell_y - reach, cell_y + reach + 1):
+                for brick_id in self.__cells.get((x, y), ()):
+
+                    entry = self.__entries[brick_id]
+                    potential_neighbour = entry[0]
+
+                    # Compute distance in both dimensions
+                    distance_x = abs(potential_neighbour.centroid_x - brick.centroid_x)
+                    distance_y = abs(potential_neighbour.centroid_y - brick.centroid_y)
+
+                    # keep the brick which was added first, like a scan over a list would find it
+                    if distance_x <= distance and distance_y <= distance \
+                            and (neighbour_entry is None or entry[1] < neighbour_entry[1]):
+                        neighbour_entry = entry
+
+        if neighbour_entry is None:
+            return None
+        return neighbour_entry[0]
+
+    # returns an independent index with the same bricks
+    def copy(self) -> 'BrickIndex':
+
+        index_copy = BrickIndex(self.cell_size)
+        for entry in self.__entries.values():
+            index_copy.append(entry[0])
+
+        return index_copy
+
+    # iterates over a snapshot of the bricks, so bricks can be removed while iterating
+    def __iter__(self):
+        return iter([entry[0] for entry in self.__entries.values()])
+
+    def __len__(self):
+        return len(self.__entries)
+
+    # checks if a brick equal to the given one is contained
+    def __contains__(self, brick):
+        return isinstance(brick, Brick) and BrickIndex.get_value_key(brick) in self.__values
+
+    def __insert_keys(self, brick_id):
+
+        entry = self.__entries[brick_id]
+        brick = entry[0]
+        entry[2] = BrickIndex.get_value_key(brick)
+        entry[3] = self.get_cell(brick)
+
+        self.__values.setdefault(entry[2], []).append(brick_id)
+        self.__cells.setdefault(entry[3], {})[brick_id] = None
+
+    def __remove_keys(self, brick_id):
+
+        entry = self.__entries[brick_id]
+
+        equal_brick_ids = self.__values[entry[2]]
+        equal_brick_ids.remove(brick_id)
+        if not equal_brick_ids:
+            del self.__values[entry[2]]
+
+        cell = self.__cells[entry[3]]
+        del cell[brick_id]
+        if not cell:
+            del self.__cells[entry[3]]
@@ -0,0 +1,66 @@
+from typing import Dict, List, Tuple
+
+from LabTable.Model.Brick import Brick, BrickStatus
+
+
+# CandidateStore class
+# holds the tracks of the tracker (the first candidate brick of a track) with the number of frames they were seen
+# and the frame they were seen last, so candidates which only flickered once can be evicted after a max age
+class CandidateStore:
+
+    def __init__(self, max_age: int):
+
+        # number of frames a candidate is kept without being seen
+        self.max_age = max_age
+        self.frame_number = 0
+
+        self.__ticks: Dict[Brick, int] = {}
+        self.__last_seen: Dict[Brick, int] = {}
+
+    # call once per frame before the candidates of the frame are added or ticked
+    def next_frame(self):
+        self.frame_number += 1
+
+    # starts tracking a new candidate
+    def add(self, brick: Brick):
+        self.__ticks[brick] = 0
+        self.__last_seen[brick] = self.frame_number
+
+    # counts another frame the candidate was seen in
+    def tick(self, brick: Brick):
+        self.__ticks[brick] += 1
+        self.__last_seen[brick] = self.frame_number
+
+    def remove(self, brick: Brick):
+        del self.__ticks[brick]
+        del self.__last_seen[brick]
+
+    # removes all unconfirmed candidates which were not seen for more than max age frames
+    # confirmed bricks are removed by the tracker once they disappeared for too long
+    # returns the number of removed candidates
+    def evict_stale(self) -> int:
+
+        stale_bricks = [brick for brick, last_seen in self.__last_seen.items()
+                        if self.frame_number - last_seen > self.max_age
+                        and brick.status == BrickStatus.CANDIDATE_BRICK]
+
+        for brick in stale_bricks:
+            self.remove(brick)
+
+        return len(stale_bricks)
+
+    def keys(self) -> List[Brick]:
+        return list(self.__ticks.keys())
+
+    # returns the candidates with the number of frames they were seen
+    def items(self) -> List[Tuple[Brick, int]]:
+        return list(self.__ticks.items())
+
+    def __getitem__(self, brick: Brick) -> int:
+        return self.__ticks[brick]
+
+    def __contains__(self, brick):
+        return brick in self.__ticks
+
+    def __len__(self):
+        return len(self.__ticks)
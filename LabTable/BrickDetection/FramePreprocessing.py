@@ -0,0 +1,84 @@
+import cv2
+import numpy as np
+
+# Edge detection thresholds
+CANNY_THRESHOLD_MIN = 30
+CANNY_THRESHOLD_MAX = 120
+
+
+# this class holds the images and contour properties every detection stage needs
+# it is built once and updated once per frame, so color conversions are computed only once
+# and the image buffers are reused from frame to frame
+class FramePreprocessing:
+
+    def __init__(self):
+
+        # the rectified region of interest (BGR) all other buffers are computed from
+        self.rectified = None
+
+        # reused image buffers
+        self.gray = None
+        self.edges = None
+        self.__hsv = None
+        self.__hsv_computed = False
+
+        # contours found in the edges image and their lazily computed properties
+        self.contours = []
+        self.__moments = []
+        self.__areas = []
+
+    # computes the shared buffers and the contours for the current frame
+    def update(self, rectified):
+
+        self.rectified = rectified
+
+        # (re)allocate the buffers only if the frame size changed
+        if self.gray is None or self.gray.shape != rectified.shape[:2]:
+            self.gray = np.zeros(rectified.shape[:2], np.uint8)
+            self.edges = np.zeros(rectified.shape[:2], np.uint8)
+            self.__hsv = np.zeros(rectified.shape, np.uint8)
+
+        # Find all edges in the inverted gray image
+        cv2.cvtColor(rectified, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        cv2.bitwise_not(self.gray, dst=self.gray)
+        cv2.Canny(self.gray, CANNY_THRESHOLD_MIN, CANNY_THRESHOLD_MAX, edges=self.edges)
+
+        # Find contours in the edges image
+        # Retrieve all of the contours without establishing any hierarchical relationships (RETR_LIST)
+        # the edges image is not used afterwards, so it is not copied
+        major = cv2.__version__.split('.')[0]
+        if major == '3':
+            _, contours, hierarchy = cv2.findContours(self.edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+        else:
+            contours, hierarchy = cv2.findContours(self.edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+        # reset the per frame data
+        self.contours = contours
+        self.__moments = [None] * len(contours)
+        self.__areas = [None] * len(contours)
+        self.__hsv_computed = False
+
+    # returns the frame in the HSV color space, it is converted on first use only
+    def get_hsv(self):
+
+        if not self.__hsv_computed:
+            cv2.cvtColor(self.rectified, cv2.COLOR_BGR2HSV, dst=self.__hsv)
+            self.__hsv_computed = True
+
+        return self.__hsv
+
+    # returns the moments of the contour with the given index
+    def get_moments(self, contour_index):
+
+        if self.__moments[contour_index] is None:
+            self.__moments[contour_index] = cv2.moments(self.contours[contour_index])
+
+        return self.__moments[contour_index]
+
+    # returns the area of the contour with the given index
+    def get_area(self, contour_index):
+
+        if self.__areas[contour_index] is None:
+            self.__areas[contour_index] = cv2.contourArea(self.contours[contour_index])
+
+        return self.__areas[contour_index]
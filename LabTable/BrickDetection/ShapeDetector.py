@@ -12,6 +12,7 @@ import numpy as np
 import math
 
 from LabTable.Model.Brick import Brick, BrickShape, BrickColor
+from .FramePreprocessing import FramePreprocessing
 
 
 # enable logger
@@ -90,9 +91,11 @@ class ShapeDetector:
         self.output_stream = output_stream
         self.resolution_width = config.get("resolution", "width")
 
-    # Check if the contour is a brick
-    # TODO: remove frame if nothing to draw anymore
-    def detect_brick(self, contour, frame) -> Brick:
+    # Check if the contour with the given index is a brick
+    # all images and contour properties are read from the frame preprocessing
+    def detect_brick(self, contour_index, frame_preprocessing: FramePreprocessing) -> Brick:
+
+        contour = frame_preprocessing.contours[contour_index]
 
         # Initialize the contour name and approximate the contour
         # with Douglas-Peucker algorithm
@@ -106,20 +109,22 @@ class ShapeDetector:
 
             # Compute contour moments, which include area,
             # its centroid, and information about its orientation
-            moments_dict = cv2.moments(contour)
+            moments_dict = frame_preprocessing.get_moments(contour_index)
 
             # Compute the centroid of the contour
             if moments_dict["m00"] != 0:
                 centroid_x = int((moments_dict["m10"] / moments_dict["m00"]))
                 centroid_y = int((moments_dict["m01"] / moments_dict["m00"]))
 
+                contour_area = frame_preprocessing.get_area(contour_index)
+
                 # TODO: Control if work correctly
                 # Eliminate too small contours
-                if cv2.contourArea(contour) < self.min_square_area:
+                if contour_area < self.min_square_area:
                     logger.debug("Don't draw -> area too small")
 
                 # Eliminate too large contours
-                elif cv2.contourArea(contour) > self.max_rectangle_area:
+                elif contour_area > self.max_rectangle_area:
                     logger.debug("Don't draw -> area too large")
 
                 else:
@@ -135,7 +140,7 @@ class ShapeDetector:
 
                         # Find the most frequent color (heu value)
                         # in the bounding box
-                        detected_color = self.find_most_frequent_hue(bbox, frame)
+                        detected_color = self.find_most_frequent_hue(bbox, frame_preprocessing.get_hsv())
 
                         # Eliminate wrong colors contours
                         if detected_color == BrickColor.UNKNOWN_COLOR:
@@ -144,7 +149,7 @@ class ShapeDetector:
                             logger.debug("Draw contour:\n Shape: {}\n Color: {}\n "
                                          "Center coordinates: {}, {}\n Contour area: {}".
                                          format(contour_shape, detected_color,
-                                                centroid_x, centroid_y, cv2.contourArea(contour)))
+                                                centroid_x, centroid_y, contour_area))
 
                             # return a Brick with the detected parameters
                             return Brick(centroid_x, centroid_y, contour_shape, detected_color)
@@ -210,28 +215,11 @@ class ShapeDetector:
 
         return rotated_bbox_lengths
 
+    # Find the most frequent hue value in the middle of the bounding box
+    # and return the configured color it belongs to
+    # frame_hsv is the whole frame already converted to the HSV color space
     @staticmethod
-    def detect_contours(frame):
-
-        # Find all edges
-        frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        frame_gray = 255 - frame_gray
-        edges = cv2.Canny(frame_gray, 30, 120)
-
-        # Find contours in the edges image
-        # Retrieve all of the contours without establishing any hierarchical relationships (RETR_LIST)
-        major = cv2.__version__.split('.')[0]
-        if major == '3':
-            _, contours, hierarchy = cv2.findContours(edges.copy(), cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
-        else:
-            contours, hierarchy = cv2.findContours(edges.copy(), cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
-
-        return contours
-
-    @staticmethod
-    def find_most_frequent_hue(bbox, frame):
-
-        frame_hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    def find_most_frequent_hue(bbox, frame_hsv):
 
         # Save dimensions of the bounding box
         (left_x, upper_y, width, height) = bbox
@@ -244,43 +232,47 @@ class ShapeDetector:
         new_left_x = left_x + int(new_width / 2)
         new_upper_y = upper_y + int(new_height / 2)
 
-        # Create a histogram with hue values of pixels
-        # which already have a correct saturation
-        hue_histogram = np.zeros(HIST_SIZE)
-        max_frequency = 0
-        most_frequent_hue_value = None
-        for x in range(new_width):
-            for y in range(new_height):
-
-                # Take only the area of the brick bounding box
-                hsv_bbox = frame_hsv[new_upper_y + y, new_left_x + x]
-
-                # Check if saturation is correct
-                if MIN_SATURATION <= hsv_bbox[SATURATION] <= MAX_SATURATION:
-
-                    # Add hue value to the histogram
-                    hue_histogram[hsv_bbox[HUE]] += 1
-
-                    # Save the most frequent hue value
-                    if hue_histogram[hsv_bbox[HUE]] > max_frequency:
-                        max_frequency = hue_histogram[hsv_bbox[HUE]]
-                        most_frequent_hue_value = hsv_bbox[HUE]
+        # Take only the area of the brick bounding box
+        # transposed so the pixels are ordered column by column
+        hsv_bbox = frame_hsv[new_upper_y:new_upper_y + new_height,
+                             new_left_x:new_left_x + new_width].transpose(1, 0, 2)
 
-        if most_frequent_hue_value is not None:
-            # Iterate through all configured color ranges
-            for mask_color, mask_config in masks_configuration.items():
-
-                # Check if found hue values
-                # are in any of configured color ranges
-                for entry in mask_config:
-
-                    # TODO: currently only one of the most frequent hue values will be returned as a detected color
-                    if entry[0][HUE] <= most_frequent_hue_value <= entry[1][HUE]:
-                        detected_color = mask_color
-
-                        # Return an accepted
-                        # detected color name
-                        return detected_color
+        # Take only the hue values of pixels
+        # which already have a correct saturation
+        saturation = hsv_bbox[:, :, SATURATION]
+        saturation_mask = (saturation >= MIN_SATURATION) & (saturation <= MAX_SATURATION)
+        hue_values = hsv_bbox[:, :, HUE][saturation_mask]
+
+        if hue_values.size == 0:
+            return BrickColor.UNKNOWN_COLOR
+
+        # Create a histogram with hue values and find the most frequent ones
+        hue_histogram = np.bincount(hue_values, minlength=HIST_SIZE)
+        max_frequency = hue_histogram.max()
+        most_frequent_hue_values = np.flatnonzero(hue_histogram == max_frequency)
+
+        # If more hue values are equally frequent take the one
+        # which reached the max frequency first (column by column)
+        most_frequent_hue_value = most_frequent_hue_values[0]
+        if len(most_frequent_hue_values) > 1:
+            reached_max_frequency = [np.flatnonzero(hue_values == hue_value)[max_frequency - 1]
+                                     for hue_value in most_frequent_hue_values]
+            most_frequent_hue_value = most_frequent_hue_values[int(np.argmin(reached_max_frequency))]
+
+        # Iterate through all configured color ranges
+        for mask_color, mask_config in masks_configuration.items():
+
+            # Check if found hue values
+            # are in any of configured color ranges
+            for entry in mask_config:
+
+                # TODO: currently only one of the most frequent hue values will be returned as a detected color
+                if entry[0][HUE] <= most_frequent_hue_value <= entry[1][HUE]:
+                    detected_color = mask_color
+
+                    # Return an accepted
+                    # detected color name
+                    return detected_color
 
         # Return if no configured color detected
         return BrickColor.UNKNOWN_COLOR
@@ -1,26 +1,39 @@
 import logging
-from typing import List
+import queue
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+from scipy.optimize import linear_sum_assignment
 
 from LabTable.Model.Brick import Brick, BrickStatus, BrickColor, BrickShape
 from ..TableUI.UIElements.UIElement import UIElement
+from ..TableUI.UIHitIndex import UIHitIndex
 from LabTable.Model.ProgramStage import ProgramStage
 from ..ExtentTracker import ExtentTracker
 from LabTable.Model.Extent import Extent
+from .BrickIndex import BrickIndex
+from .CandidateStore import CandidateStore
 
 # configure logging
 logger = logging.getLogger(__name__)
 
 PLAYER_POSITION_ASSET_ID = 13
 
+# association cost of a candidate and a track which must not be associated
+INFEASIBLE_COST = 1e6
+
+# kinds of server side updates
+STORED_INSTANCES_UPDATE = "stored instances"
+INSTANCE_CHANGES_UPDATE = "instance changes"
+
 
 class Tracker:
 
     BRICKS_REFRESHED = False
 
     server_communicator = None
-    tracked_candidates = {}  # we hold candidates which are not confirmed yet for some ticks
-    confirmed_bricks: List[Brick] = []
-    virtual_bricks: List[Brick] = []
+    tracked_candidates: CandidateStore = None  # we hold candidates which are not confirmed yet for some ticks
+    confirmed_bricks: BrickIndex = None
+    virtual_bricks: BrickIndex = None
     tracked_disappeared = {}  # we hold confirmed bricks marked for removal after some ticks
     min_distance: int = None
     external_min_appeared: int = None
@@ -32,12 +45,29 @@ class Tracker:
         self.server_communicator = server_communicator
         self.ui_root = ui_root
 
+        # flat index of the ui element areas, so all bricks are checked against the ui at once
+        self.ui_hit_index = UIHitIndex(ui_root)
+
         # get ticker thresholds from config
         self.min_distance = config.get("tracker_thresholds", "min_distance")
         self.external_min_appeared = config.get("tracker_thresholds", "external_min_appeared")
         self.external_max_disappeared = config.get("tracker_thresholds", "external_max_disappeared")
         self.internal_min_appeared = config.get("tracker_thresholds", "internal_min_appeared")
         self.internal_max_disappeared = config.get("tracker_thresholds", "internal_max_disappeared")
+
+        # bricks are indexed on a grid with the min distance as cell size
+        # so neighbours are found by checking only the adjacent cells
+        self.confirmed_bricks = BrickIndex(self.min_distance)
+        self.virtual_bricks = BrickIndex(self.min_distance)
+
+        # tracks (the first candidate brick of a track) with the number of frames they were seen
+        # candidates not seen for candidate_max_age frames are evicted
+        self.tracked_candidates = CandidateStore(config.get("tracker_thresholds", "candidate_max_age"))
+        self.next_track_id = 0
+
+        # results of brick_would_land_on_ui per tracked candidate
+        # with the ui layout version and the extents they were computed with
+        self.ui_hit_cache = {}
         self.allowed_bricks = {
             ProgramStage.EVALUATION: [
                 (BrickColor.RED_BRICK, BrickShape.SQUARE_BRICK),
@@ -58,14 +88,51 @@ class Tracker:
         # Initialize the current player
         self.player = None
 
-    # syncs all currently known bricks with the currently known bricks list on the server
+        # the virtual bricks of the assets stored on the server by their assetpos_id, kept up to date by delta syncs
+        self.server_bricks: Dict[str, Brick] = {}
+
+        # the assetpos_ids of the bricks removed by this table, until the server reports them removed
+        # a sync running while the remove request is sent still lists them, so they are not added again
+        self.locally_removed_assetpos_ids: Set[str] = set()
+
+        # the server side bricks are fetched by the scheduler thread, but the brick indices are not thread safe
+        # so the updates are queued as (kind, data) and applied on the main thread in update
+        self.server_side_updates = queue.Queue()
+
+    # fetches the bricks stored on the server and queues them to be synced with the currently known bricks
+    # this is called from the scheduler thread, the bricks are synced on the next update
     def sync_with_server_side_bricks(self):
 
-        # get server side bricks
         asset_ids = self.config.get("stored_instances", "asset_ids")
-        server_bricks = []
-        for asset_id in asset_ids:
-            server_bricks += self.server_communicator.get_stored_brick_instances(asset_id)
+
+        # only get the changes since the last sync if the server supports it
+        changes = self.server_communicator.get_brick_instance_changes(asset_ids)
+        if changes is not None:
+            self.server_side_updates.put((INSTANCE_CHANGES_UPDATE, changes))
+            return
+
+        # get server side bricks
+        server_bricks = self.server_communicator.get_all_stored_brick_instances(asset_ids)
+        self.server_side_updates.put((STORED_INSTANCES_UPDATE, server_bricks))
+
+    # applies the server side updates queued since the last call and returns their number
+    def apply_server_side_updates(self) -> int:
+
+        updates_number = 0
+        while True:
+            try:
+                kind, data = self.server_side_updates.get_nowait()
+            except queue.Empty:
+                return updates_number
+
+            if kind == STORED_INSTANCES_UPDATE:
+                self.merge_stored_brick_instances(data)
+            else:
+                self.apply_server_side_changes(*data)
+            updates_number += 1
+
+    # adds the stored bricks of the server which are unknown and removes the virtual bricks not stored anymore
+    def merge_stored_brick_instances(self, server_bricks: List[Brick]):
 
         # handle bricks
         if server_bricks is not None:
@@ -88,7 +155,7 @@ class Tracker:
                         and brick.asset_id not in c_brick_ids:
                     self.virtual_bricks.append(brick)
 
-            for v_brick in self.virtual_bricks:
+            for v_brick in list(self.virtual_bricks):
 
                 # remove all virtual bricks that have been removed externally
                 if v_brick.status == BrickStatus.EXTERNAL_BRICK and v_brick.asset_id not in s_brick_ids \
@@ -108,10 +175,67 @@ class Tracker:
                     logger.info("re-registered missing brick in server: {}".format(c_brick))
             """
 
+    # adds, moves and removes the virtual bricks of the assets which changed on the server since the last sync
+    # if the changes are complete, all other known server bricks were removed
+    def apply_server_side_changes(self, changed_bricks: List[Brick], removed_assetpos_ids: List[str], complete: bool):
+
+        if complete:
+            changed_assetpos_ids = {str(brick.assetpos_id) for brick in changed_bricks}
+            removed_assetpos_ids = [assetpos_id for assetpos_id in self.server_bricks
+                                    if assetpos_id not in changed_assetpos_ids]
+            self.locally_removed_assetpos_ids &= changed_assetpos_ids
+
+        self.locally_removed_assetpos_ids.difference_update(removed_assetpos_ids)
+
+        if changed_bricks:
+            # the server also reports the assets created by this table, they are not added again
+            synced_bricks = set(map(id, self.server_bricks.values()))
+            own_assetpos_ids = {str(brick.assetpos_id) for bricks in (self.confirmed_bricks, self.virtual_bricks)
+                                for brick in bricks if brick.assetpos_id is not None and id(brick) not in synced_bricks}
+
+        for brick in changed_bricks:
+
+            assetpos_id = str(brick.assetpos_id)
+            known_brick = self.server_bricks.get(assetpos_id)
+
+            if brick.asset_id == PLAYER_POSITION_ASSET_ID:
+                self.player = brick
+                logger.debug("set the player {}".format(self.player))
+
+            # move the known virtual brick
+            if known_brick is not None and known_brick in self.virtual_bricks:
+                known_brick.map_pos_x = brick.map_pos_x
+                known_brick.map_pos_y = brick.map_pos_y
+                Extent.calc_local_pos(known_brick, self.extent_tracker.board, self.extent_tracker.map_extent)
+                self.virtual_bricks.update_position(known_brick)
+
+            # add server brick to virtual bricks if it is unknown and was not removed by this table
+            elif assetpos_id not in own_assetpos_ids and assetpos_id not in self.locally_removed_assetpos_ids:
+                self.virtual_bricks.append(brick)
+                self.server_bricks[assetpos_id] = brick
+
+            Tracker.BRICKS_REFRESHED = True
+
+        for assetpos_id in removed_assetpos_ids:
+
+            # remove all virtual bricks that have been removed externally
+            removed_brick = self.server_bricks.get(assetpos_id)
+            if removed_brick is None or removed_brick.asset_id == PLAYER_POSITION_ASSET_ID:
+                continue
+
+            del self.server_bricks[assetpos_id]
+            if removed_brick in self.virtual_bricks:
+                self.virtual_bricks.remove(removed_brick)
+                Tracker.BRICKS_REFRESHED = True
+                logger.info("removed externally removed virtual brick")
+
     # called once a frame while in ProgramStage EVALUATION or PLANNING
     # keeps track of bricks and returns a list of all currently confirmed bricks
     def update(self, brick_candidates: List[Brick], program_stage):
 
+        # add, move and remove the virtual bricks of the server side bricks fetched since the last frame
+        self.apply_server_side_updates()
+
         # count frames certain bricks have been continuously visible / gone
         self.do_brick_ticks(brick_candidates)
 
@@ -135,37 +259,43 @@ class Tracker:
         # finally return the updated list of confirmed bricks
         return self.confirmed_bricks
 
-    # iterates over all candidates and manages their tick counters
+    # associates the candidates with the tracks and manages their tick counters
     def do_brick_ticks(self, brick_candidates: List[Brick]):
+        self.tracked_candidates.next_frame()
+
+        # forget candidates which flickered only shortly, so the store does not grow over long sessions
+        self.tracked_candidates.evict_stale()
+
         # copy the confirmed bricks
         possible_removed_bricks = self.confirmed_bricks.copy()
 
-        # iterate through all candidates
-        for candidate in brick_candidates:
+        # every track is associated with at most one candidate of the frame
+        tracks = self.tracked_candidates.keys()
+        associated_tracks, candidates_near_tracks, tracks_near_candidates = \
+            self.associate_candidates(brick_candidates, tracks)
 
-            # remove the candidate from the possible removed bricks
-            if candidate in possible_removed_bricks:
-                possible_removed_bricks.remove(candidate)
+        # a confirmed brick is seen if any candidate lies within min distance, even one of another color or shape
+        # so a single frame with a misdetected color does not let it disappear
+        for track, near_candidate in zip(tracks, tracks_near_candidates):
+            if near_candidate and track.status != BrickStatus.CANDIDATE_BRICK and track in possible_removed_bricks:
+                possible_removed_bricks.remove(track)
+                if track in self.tracked_disappeared:
+                    del self.tracked_disappeared[track]
 
-            # check if this candidate is already in the list
-            if candidate not in self.confirmed_bricks:
+        new_tracks = []
+        for candidate, track, near_track in zip(brick_candidates, associated_tracks, candidates_near_tracks):
 
-                # check if candidate is in minimum distance to any of confirmed bricks
-                neighbour_brick = self.check_min_distance(candidate, self.confirmed_bricks)
-                if not neighbour_brick:
+            if track is not None:
+                self.tracked_candidates.tick(track)
 
-                    # create or add a tick if it's not yet confirmed
-                    if candidate in self.tracked_candidates:
-                        self.tracked_candidates[candidate] += 1
-                    else:
-                        self.tracked_candidates[candidate] = 0
+            # start a new track if the candidate is not within min distance of another track
+            # (otherwise it is e.g. the second contour of a brick or a brick with a misdetected color or shape)
+            elif not near_track and not self.check_min_distance(candidate, new_tracks):
+                candidate.track_id = self.next_track_id
+                self.next_track_id += 1
 
-                else:
-                    self.tracked_candidates[neighbour_brick] += 1
-            else:
-                # if the brick reappeared stop tracking it as disappeared
-                if candidate in self.tracked_disappeared:
-                    del self.tracked_disappeared[candidate]
+                self.tracked_candidates.add(candidate)
+                new_tracks.append(candidate)
 
         # start tracking the not reappeared bricks as possible removed
         for possible_removed_brick in possible_removed_bricks:
@@ -175,6 +305,47 @@ class Tracker:
             else:
                 self.tracked_disappeared[possible_removed_brick] = 0
 
+    # associates every candidate with at most one track of the same color and shape within min distance
+    # so that the sum of the distances is minimal (hungarian algorithm)
+    # returns the associated track (or None) for every candidate,
+    # whether the candidate lies within min distance of any track
+    # and whether the track lies within min distance of any candidate
+    def associate_candidates(self, brick_candidates: List[Brick], tracks: List[Brick]) \
+            -> Tuple[List[Optional[Brick]], List[bool], List[bool]]:
+
+        associated_tracks = [None] * len(brick_candidates)
+        if not brick_candidates or not tracks:
+            return associated_tracks, [False] * len(brick_candidates), [False] * len(tracks)
+
+        candidate_positions = np.array([[b.centroid_x, b.centroid_y] for b in brick_candidates], dtype=np.float64)
+        track_positions = np.array([[b.centroid_x, b.centroid_y] for b in tracks], dtype=np.float64)
+        candidate_types = np.array([Tracker.get_brick_type_number(b) for b in brick_candidates])
+        track_types = np.array([Tracker.get_brick_type_number(b) for b in tracks])
+
+        # distance in both dimensions like in check_min_distance
+        distances = np.abs(candidate_positions[:, np.newaxis, :] - track_positions[np.newaxis, :, :]).max(axis=2)
+        near = distances <= self.min_distance
+        feasible = near & (candidate_types[:, np.newaxis] == track_types[np.newaxis, :])
+
+        # solve the assignment only for candidates and tracks which can be associated at all
+        candidate_indices = np.flatnonzero(feasible.any(axis=1))
+        track_indices = np.flatnonzero(feasible.any(axis=0))
+
+        if candidate_indices.size:
+            costs = np.where(feasible, distances, INFEASIBLE_COST)[np.ix_(candidate_indices, track_indices)]
+            rows, columns = linear_sum_assignment(costs)
+
+            for row, column in zip(rows, columns):
+                if costs[row, column] < INFEASIBLE_COST:
+                    associated_tracks[candidate_indices[row]] = tracks[track_indices[column]]
+
+        return associated_tracks, list(near.any(axis=1)), list(near.any(axis=0))
+
+    # returns a number which is equal for bricks of the same color and shape
+    @staticmethod
+    def get_brick_type_number(brick: Brick) -> int:
+        return brick.color.value * len(BrickShape) + brick.shape.value
+
     # removes those bricks that have been invisible for too long
     def remove_overtime_disappeared_bricks(self):
 
@@ -203,35 +374,41 @@ class Tracker:
 
                 # if the brick is associated with an asset also send a remove request to the server
                 if brick.status == BrickStatus.EXTERNAL_BRICK:
-                    self.server_communicator.remove_remote_brick_instance(brick)
+                    self.remove_remote_brick_instance(brick)
 
         # remove the disappeared elements from dicts
         for brick in bricks_to_remove:
-            del self.tracked_candidates[brick]
+            self.tracked_candidates.remove(brick)
             del self.tracked_disappeared[brick]
 
     # does ui update for all already confirmed bricks and mark as outdated if necessary
     def do_confirmed_ui_update(self):
 
-        for brick in self.confirmed_bricks:
+        confirmed_bricks = list(self.confirmed_bricks)
+        for brick, on_ui in zip(confirmed_bricks, self.bricks_on_ui(confirmed_bricks)):
 
             # mark all bricks as outdated that previously were on ui and now lie on the map or vice versa
             # this might happen when a ui elements visibility gets toggled
-            if self.brick_on_ui(brick):
+            if on_ui:
                 if brick.status == BrickStatus.EXTERNAL_BRICK:
                     Tracker.set_brick_outdated(brick)
-                    self.server_communicator.remove_remote_brick_instance(brick)
+                    self.remove_remote_brick_instance(brick)
             else:
                 if brick.status == BrickStatus.INTERNAL_BRICK:
                     Tracker.set_brick_outdated(brick)
 
     def remove_old_virtual_bricks(self):
 
+        # check all internal virtual bricks against the ui at once
+        virtual_bricks = list(self.virtual_bricks)
+        internal_bricks_on_ui = iter(self.bricks_on_ui(
+            [v_brick for v_brick in virtual_bricks if v_brick.status == BrickStatus.INTERNAL_BRICK]))
+
         # update virtual bricks
-        for v_brick in self.virtual_bricks:
+        for v_brick in virtual_bricks:
 
             # remove any virtual internal bricks that do not lie on ui elements anymore
-            if v_brick.status == BrickStatus.INTERNAL_BRICK and not self.brick_on_ui(v_brick):
+            if v_brick.status == BrickStatus.INTERNAL_BRICK and not next(internal_bricks_on_ui):
                 self.virtual_bricks.remove(v_brick)
 
             # remove all previous players
@@ -242,16 +419,19 @@ class Tracker:
     # selects those candidates that appeared long enough to be considered confirmed and add them to the confirmed list
     # also does ui update for those bricks and classifies them
     def select_and_classify_candidates(self, program_stage):
+        # only the results of the currently tracked candidates are kept
+        ui_hit_cache = self.ui_hit_cache
+        self.ui_hit_cache = {}
+
         # add the qualified candidates to the confirmed list and do ui update for them
         for candidate, amount in self.tracked_candidates.items():
 
             # select the correct threshold on whether or not the candidate would be internal
             # (internal bricks appear faster)
+            # the ui tree is only walked again if the candidate is new or the ui layout changed
             target_appeared = self.external_min_appeared
-            if self.brick_would_land_on_ui(candidate):
+            if self.brick_would_land_on_ui_cached(candidate, ui_hit_cache):
                 target_appeared = self.internal_min_appeared
-            # NOTE calling brick_would_land_on_ui every frame might cause performance hits
-            #  a cheaper solution would be to call it once the first frame the candidate registered and save the result
 
             # check for the threshold value of new candidates
             if amount > target_appeared and candidate not in self.confirmed_bricks:
@@ -293,6 +473,10 @@ class Tracker:
     # Check if the brick lies within min distance to the any in the list
     def check_min_distance(self, brick, bricks_list):
 
+        # indexed bricks are looked up in the adjacent grid cells only
+        if isinstance(bricks_list, BrickIndex):
+            return bricks_list.find_neighbour(brick, self.min_distance)
+
         neighbour_brick = None
 
         # Look for brick within min distance
@@ -322,6 +506,7 @@ class Tracker:
             for brick in self.virtual_bricks:
                 if brick.status == BrickStatus.EXTERNAL_BRICK:
                     Extent.calc_local_pos(brick, self.extent_tracker.board, self.extent_tracker.map_extent)
+                    self.virtual_bricks.update_position(brick)
 
             logger.info("set bricks outdated because extent changed")
             self.invalidate_external_bricks()
@@ -342,16 +527,66 @@ class Tracker:
         Tracker.BRICKS_REFRESHED = True
 
     def remove_external_virtual_brick(self, brick: Brick):
-        self.server_communicator.remove_remote_brick_instance(brick)
+        self.remove_remote_brick_instance(brick)
         self.virtual_bricks.remove(brick)
 
+    # sends a remove request and remembers the assetpos_id until the server reports the brick removed
+    def remove_remote_brick_instance(self, brick: Brick):
+        if brick.assetpos_id is not None:
+            self.locally_removed_assetpos_ids.add(str(brick.assetpos_id))
+        self.server_communicator.remove_remote_brick_instance(brick)
+
     def brick_on_ui(self, brick):
-        brick_on_beamer = Extent.remap_brick(brick, self.extent_tracker.board, self.extent_tracker.beamer)
-        return self.ui_root.brick_on_element(brick_on_beamer)
+        return self.bricks_on_ui([brick])[0]
+
+    # checks for every brick if it lies on the ui and lets the element it lies on handle it (e.g. a button press)
+    # like calling ui_root.brick_on_element for every brick, but all bricks are checked in one vectorized query
+    # if handling a brick changes the ui layout, the remaining bricks are checked again against the new layout
+    def bricks_on_ui(self, bricks: List[Brick]) -> List[bool]:
+
+        results = []
+        while len(results) < len(bricks):
+
+            remaining_bricks = bricks[len(results):]
+            points = Extent.remap_points([[b.centroid_x, b.centroid_y] for b in remaining_bricks],
+                                         self.extent_tracker.board, self.extent_tracker.beamer)
+            layout_version = UIElement.layout_version
+
+            for brick, point, element in zip(remaining_bricks, points, self.ui_hit_index.get_hit_elements(points)):
+                results.append(element is not None)
+
+                if element is not None:
+                    brick_on_beamer = brick.clone()
+                    brick_on_beamer.centroid_x, brick_on_beamer.centroid_y = point
+                    element.handle_brick_on_element(brick_on_beamer)
+
+                    if UIElement.layout_version != layout_version:
+                        break
+
+        return results
 
     def brick_would_land_on_ui(self, brick):
-        brick_on_beamer = Extent.remap_brick(brick, self.extent_tracker.board, self.extent_tracker.beamer)
-        return self.ui_root.brick_would_land_on_element(brick_on_beamer)
+        point = Extent.remap_points([[brick.centroid_x, brick.centroid_y]],
+                                    self.extent_tracker.board, self.extent_tracker.beamer)
+        return self.ui_hit_index.points_on_elements(point)[0]
+
+    # returns the cached result of brick_would_land_on_ui if the ui layout and the extents did not change
+    # and stores the result for the next frame
+    def brick_would_land_on_ui_cached(self, brick, ui_hit_cache):
+
+        layout_version = UIElement.layout_version
+        board = self.extent_tracker.board
+        beamer = self.extent_tracker.beamer
+
+        cached_result = ui_hit_cache.get(brick)
+        if cached_result is not None and cached_result[0] == layout_version \
+                and cached_result[1] is board and cached_result[2] is beamer:
+            self.ui_hit_cache[brick] = cached_result
+            return cached_result[3]
+
+        result = self.brick_would_land_on_ui(brick)
+        self.ui_hit_cache[brick] = (layout_version, board, beamer, result)
+        return result
 
     # sets all external bricks to outdated
     def invalidate_external_bricks(self):
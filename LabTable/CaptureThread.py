@@ -0,0 +1,92 @@
+import logging
+import threading
+import numpy as np
+import pyrealsense2 as rs
+
+from .FrameBuffer import FrameBuffer
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# seconds to wait after a failed frame, doubled for every further failure up to the max delay
+FAILED_FRAME_MIN_DELAY = 0.1
+FAILED_FRAME_MAX_DELAY = 2
+
+# capturing is stopped after this number of consecutive failed frames (e.g. the camera was disconnected)
+MAX_FAILED_FRAMES = 10
+
+
+# CaptureThread class
+# waits for new frames of the realsense pipeline and writes them into the frame buffer
+# so a slow frame in the main loop does not stall the capturing
+# the depth frame is only aligned and written while depth_required is set
+# capturing stops (and the frame buffer is closed) at the end of a recorded stream or if no frames arrive anymore
+class CaptureThread(threading.Thread):
+
+    def __init__(self, pipeline, alignment_stream, frame_buffer: FrameBuffer, depth_required: threading.Event,
+                 playback=None):
+        threading.Thread.__init__(self)
+
+        self.pipeline = pipeline
+        self.playback = playback
+        self.alignment_stream = alignment_stream
+        self.frame_buffer = frame_buffer
+        self.depth_required = depth_required
+
+        self.stopped = threading.Event()
+
+    def run(self):
+
+        logger.info("starting to capture frames")
+
+        failed_frames_number = 0
+        while not self.stopped.is_set():
+
+            # Wait for depth and color frames
+            try:
+                frames = self.pipeline.wait_for_frames()
+            except RuntimeError as error:
+
+                if self.playback is not None and self.playback.current_status() == rs.playback_status.stopped:
+                    logger.info("end of the recorded stream")
+                    break
+
+                failed_frames_number += 1
+                if failed_frames_number >= MAX_FAILED_FRAMES:
+                    logger.error("no frame received {} times in a row, giving up".format(failed_frames_number))
+                    break
+
+                logger.warning("no frame received: {}".format(error))
+                self.stopped.wait(min(FAILED_FRAME_MIN_DELAY * 2 ** (failed_frames_number - 1),
+                                      FAILED_FRAME_MAX_DELAY))
+                continue
+
+            failed_frames_number = 0
+
+            # without depth only the color frame is needed
+            if not self.depth_required.is_set():
+                color_frame = frames.get_color_frame()
+                if color_frame:
+                    self.frame_buffer.write(np.asanyarray(color_frame.get_data()))
+                continue
+
+            # Align the depth frame to color frame
+            aligned_frames = self.alignment_stream.process(frames)
+
+            # Get aligned frames (depth images)
+            aligned_depth_frame = aligned_frames.get_depth_frame()
+            color_frame = aligned_frames.get_color_frame()
+
+            # Validate that both frames are valid and convert them to numpy arrays
+            if aligned_depth_frame and color_frame:
+                self.frame_buffer.write(
+                    np.asanyarray(color_frame.get_data()),
+                    np.asanyarray(aligned_depth_frame.get_data())
+                )
+
+        self.frame_buffer.close()
+        logger.info("stopped capturing frames")
+
+    # stops capturing after the current frame
+    def stop(self):
+        self.stopped.set()
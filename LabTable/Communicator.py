@@ -2,24 +2,33 @@
 # FIXME: THIS CLASS WILL BE COMPLETELY REWORKED TO COMMUNICATE WITH THE CLIENT DIRECTLY
 
 import logging
-import websockets
-import asyncio
 import ssl
 import json
+from typing import Dict, List, Optional, Tuple
 
 from LabTable.Model.Brick import Brick, BrickStatus
 from LabTable.Model.Extent import Extent
 from .ExtentTracker import ExtentTracker
 from LabTable.Model.ProgramStage import ProgramStage
+from .WebsocketSession import WebsocketSession
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 # remote communication protocol
 URI = "wss://{}:{}"  # this is a websocket ssl connection
+UNENCRYPTED_URI = "ws://{}:{}"  # used if no ssl pem file is configured (e.g. for the stand-in server)
 CREATE_ASSET_MSG = "ASSETPOS_CREATE {brick_id} {brick_x} {brick_y}"
 UPDATE_ASSET_MSG = "ASSETPOS_UPDATE {brick_id} {brick_x} {brick_y}"
 REMOVE_ASSET_MSG = "ASSETPOS_REMOVE {brick_id}"
+BATCH_ASSET_MSG = "ASSETPOS_BATCH {messages}"  # messages is a json list of ASSETPOS messages
+BATCH_RESULTS_STRING = "RESULTS"  # the json list of answers to the messages of a batch, in the same order
+CHANGES_ASSET_MSG = "ASSETPOS_CHANGES {sync_token} {asset_ids}"  # asset_ids is a comma separated list
+SYNC_TOKEN_STRING = "SYNC_TOKEN"  # the token to send with the next changes request
+CHANGED_STRING = "CHANGED"  # created or moved assets: {assetpos_id: {"asset_id": ..., "position": [x, y]}}
+REMOVED_STRING = "REMOVED"  # list of removed assetpos ids
+COMPLETE_STRING = "COMPLETE"  # true if CHANGED holds all assets (e.g. for the first request or an expired token)
+NO_SYNC_TOKEN = "0"
 ANSWER_STRING = "REQUEST_RESULT"
 ASSETPOS_ID_STRING = "ASSETPOS_ID"
 SUCCESS_ANSWER = "SUCCESS"
@@ -28,6 +37,7 @@ GET_SCENARIO_INFO = "/location/scenario/list.json"
 GET_INSTANCES = "/assetpos/get_all/"
 GET_ENERGY_TARGET = "/energy/target/"
 GET_ENERGY_CONTRIBUTION = "/energy/contribution/"
+JSON = ".json"
 
 
 class Communicator:
@@ -35,6 +45,7 @@ class Communicator:
 
     _uri = None
     _ssl_context = None
+    _session = None
 
     def __init__(self, config, program_stage):
 
@@ -48,25 +59,88 @@ class Communicator:
         ip = self.config.get("server", "ip")
         port = self.config.get("server", "port")
         ssl_pem_file = self.config.get("server", "ssl_pem_file")
-        self._uri = URI.format(ip, port)
-        self._ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-        self._ssl_context.load_verify_locations(ssl_pem_file)
+        if ssl_pem_file:
+            self._uri = URI.format(ip, port)
+            self._ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            self._ssl_context.load_verify_locations(ssl_pem_file)
+        else:
+            logger.warning("no ssl pem file configured, the connection to the server is not encrypted")
+            self._uri = UNENCRYPTED_URI.format(ip, port)
+
+        # all messages are sent over one connection which is kept open
+        self._session = WebsocketSession(
+            self._uri,
+            self._ssl_context,
+            self.config.get("server", "request_timeout"),
+            self.config.get("server", "reconnect_min_delay"),
+            self.config.get("server", "reconnect_max_delay"),
+            self.config.get("server", "request_envelope")
+        )
+
+        # several ASSETPOS messages are sent as one batch message until the server turns out not to support it
+        self.batch_messages = self.config.get("server", "batch_messages")
+
+        # stored instances are synced by their changes since the last sync token
+        # until the server turns out not to support it
+        self.delta_sync = self.config.get("server", "delta_sync")
+        self.sync_token = NO_SYNC_TOKEN
 
     # this sends an message to the server and returns the json answer
-    async def send_message(self, message: str) -> json:
+    # an empty answer is returned if the server could not be reached or did not answer in time
+    def send_message(self, message: str) -> Dict:
+
+        try:
+            return self._session.request(message)
+        except (ConnectionError, TimeoutError) as error:
+            logger.warning("could not send message {}: {}".format(message, error))
+            return {}
+
+    # sends several independent messages concurrently and returns their json answers in the same order
+    # empty answers are returned for the messages which could not be sent or were not answered in time
+    def send_concurrent_messages(self, messages: List[str]) -> List[Dict]:
+
+        answers = []
+        for message, answer in zip(messages, self._session.request_all(messages)):
+            if isinstance(answer, (ConnectionError, TimeoutError)):
+                logger.warning("could not send message {}: {}".format(message, answer))
+                answer = {}
+            elif isinstance(answer, Exception):
+                raise answer
+            answers.append(answer)
 
-        async with websockets.connect( self._uri, ssl=self._ssl_context) as websocket:
+        return answers
 
-            logger.debug("sending message: {}".format(message))
-            await websocket.send(message)
-            ret = await websocket.recv()
-            logger.debug("received message: {}".format(ret))
+    # sends several messages and returns their json answers in the same order
+    # if the server supports it they are sent as one batch message, otherwise one by one
+    def send_messages(self, messages: List[str]) -> List[Dict]:
 
-            # we expect json answers only
-            return json.loads(ret)
+        if len(messages) > 1 and self.batch_messages:
+
+            response = self.send_message(BATCH_ASSET_MSG.format(messages=json.dumps(messages)))
+            results = response.get(BATCH_RESULTS_STRING)
+            if isinstance(results, list) and len(results) == len(messages):
+                return results
+
+            # an empty answer means the server could not be reached, any other one that it does not know batches
+            if not response:
+                return [{} for _ in messages]
+
+            logger.warning("the server does not support batch messages, sending them one by one")
+            self.batch_messages = False
+
+        return [self.send_message(message) for message in messages]
+
+    # closes the connection to the server
+    def close(self):
+        self._session.close()
 
     # Create remote brick instance
     def create_remote_brick_instance(self, brick: Brick):
+        self.prepare_remote_brick_instance(brick)
+        self.handle_create_answer(brick, self.send_create_request(brick))
+
+    # computes the geographical position and the asset id of a brick before it is created remotely
+    def prepare_remote_brick_instance(self, brick: Brick):
 
         logger.debug("creating a brick instance for {}".format(brick))
 
@@ -80,16 +154,40 @@ class Communicator:
         else:
             brick.map_asset_id(self.config)
 
-        # Send request creating remote brick instance and save the response
-        create_instance_msg = CREATE_ASSET_MSG.format(
+    # sends the request creating the remote instance of a prepared brick and returns the answer
+    def send_create_request(self, brick: Brick) -> Dict:
+        return self.apply_create_response(brick, self.send_message(self.get_create_message(brick)))
+
+    # returns the message creating the remote instance of a prepared brick
+    @staticmethod
+    def get_create_message(brick: Brick) -> str:
+        return CREATE_ASSET_MSG.format(
             brick_id=str(brick.asset_id), brick_x=str(brick.map_pos_x), brick_y=str(brick.map_pos_y)
         )
 
-        response = self.send_message(create_instance_msg)
-        if response.get(ANSWER_STRING) is SUCCESS_ANSWER:
+    # saves the assetpos_id of a created brick, so a following remove request of the brick can use it
+    @staticmethod
+    def apply_create_response(brick: Brick, response: Dict) -> Dict:
+
+        if response.get(ANSWER_STRING) == SUCCESS_ANSWER:
+            brick.assetpos_id = Communicator.get_created_assetpos_id(response)
+
+        return response
+
+    # returns the assetpos_id in the answer to a create request or None if the creation failed
+    @staticmethod
+    def get_created_assetpos_id(response: Dict):
+
+        if response.get(ANSWER_STRING) == SUCCESS_ANSWER:
 
             # Get assetpos_id in response
-            brick.assetpos_id = response.get(ASSETPOS_ID_STRING)
+            return response.get(ASSETPOS_ID_STRING)
+
+        return None
+
+    def handle_create_answer(self, brick: Brick, response: Dict):
+
+        if response.get(ANSWER_STRING) == SUCCESS_ANSWER:
 
             # call brick update callback function to update progress bars etc.
             self.brick_update_callback()
@@ -102,9 +200,17 @@ class Communicator:
 
     # Remove remote brick instance
     def remove_remote_brick_instance(self, brick_instance):
+        self.handle_remove_answer(brick_instance, self.send_remove_request(brick_instance))
 
-        # Send a request to remove brick instance
-        response = self.send_message(REMOVE_ASSET_MSG.format(brick_instance.assetpos_id))
+    # Send a request to remove brick instance
+    def send_remove_request(self, brick_instance) -> Dict:
+        return self.send_message(self.get_remove_message(brick_instance.assetpos_id))
+
+    @staticmethod
+    def get_remove_message(assetpos_id) -> str:
+        return REMOVE_ASSET_MSG.format(brick_id=assetpos_id)
+
+    def handle_remove_answer(self, brick_instance, response: Dict):
 
         if response.get(ANSWER_STRING) == SUCCESS_ANSWER:
 
@@ -116,10 +222,8 @@ class Communicator:
 
     def get_scenario_info(self, scenario_name):
 
-        request_return = self.send_message("{}".format(GET_SCENARIO_INFO))
-
         # FIXME: rework protocol
-        scenarios = json.loads(request_return.text)
+        scenarios = self.send_message("{}".format(GET_SCENARIO_INFO))
 
         for scenario_key in scenarios:
             scenario = scenarios[scenario_key]
@@ -137,82 +241,115 @@ class Communicator:
 
         logger.debug("getting stored brick instances from the server...")
 
+        stored_instances_response = self.send_message(Communicator.get_stored_instances_message(asset_id))
+        return self.read_stored_brick_instances(asset_id, stored_instances_response)
+
+    # returns the stored brick instances of all given asset ids
+    # the requests are sent at once, so this takes about as long as one request
+    def get_all_stored_brick_instances(self, asset_ids: List[int]) -> List[Brick]:
+
+        logger.debug("getting stored brick instances of {} assets from the server...".format(len(asset_ids)))
+
+        stored_instances_responses = self.send_concurrent_messages(
+            [Communicator.get_stored_instances_message(asset_id) for asset_id in asset_ids])
+
         stored_instances_list = []
+        for asset_id, stored_instances_response in zip(asset_ids, stored_instances_responses):
+            stored_instances_list += self.read_stored_brick_instances(asset_id, stored_instances_response)
+
+        return stored_instances_list
+
+    @staticmethod
+    def get_stored_instances_message(asset_id) -> str:
+        return "{command}{asset_id}{json}".format(command=GET_INSTANCES, asset_id=str(asset_id), json=JSON)
 
-        stored_instances_msg = "{command}{asset_id}{json}".format(command=GET_INSTANCES, asset_id=str(asset_id),
-                                                                  json=JSON)
-        stored_instances_response = self.send_message(stored_instances_msg)
+    # creates the bricks of the stored instances of an asset from the answer of the server
+    def read_stored_brick_instances(self, asset_id, stored_instances_response: Dict) -> List[Brick]:
+
+        stored_instances_list = []
 
         # FIXME: rework protocol
-        # If status code is 200, save response text
-        bricks_instance_response_text = json.loads(stored_instances_response.text)
-        stored_assets = bricks_instance_response_text["assets"]
+        stored_assets = stored_instances_response.get("assets")
 
         if stored_assets is not None:
 
             # Save all instances with their properties as a list
             for assetpos_id in stored_assets:
-
-                # Create a brick instance
-                stored_instance = Brick(None, None, None, None)
-
-                # Get the map position of the player
-                position = stored_assets[assetpos_id]["position"]
-                stored_instance.map_pos_x = position[0]
-                stored_instance.map_pos_y = position[1]
-
-                shape = None
-                color = None
-                try:
-                    # Map a shape and color using known asset_id
-                    shape_color = self.config.get("stored_instances", str(asset_id))
-                    shape = shape_color.split(', ')[0]
-                    color = shape_color.split(', ')[1]
-                except:
-                    logger.info("Mapping of color and shape for asset_id {} is not possible".format(str(asset_id)))
-
-                # Add missing properties
-                stored_instance.shape = shape
-                stored_instance.color = color
-                stored_instance.asset_id = asset_id
-                stored_instance.assetpos_id = assetpos_id
-                stored_instance.status = BrickStatus.EXTERNAL_BRICK
-
-                # Calculate map position of a brick
-                Extent.calc_local_pos(stored_instance, self.extent_tracker.board,
-                                      self.extent_tracker.map_extent)
-
-                stored_instances_list.append(stored_instance)
+                stored_instances_list.append(
+                    self.create_stored_instance(asset_id, assetpos_id, stored_assets[assetpos_id]["position"]))
 
         return stored_instances_list
 
-    # initiates corner point update of the given main map extent on the server
-    def update_extent_info(self, extent: Extent):
+    # returns the assets of the given types which were created, moved or removed on the server since the last call
+    # as list of changed bricks, list of removed assetpos ids and whether the changes are the complete current state
+    # (e.g. on the first call) so all other bricks of the types can be dropped
+    # returns None if the server does not support change tokens, then get_stored_brick_instances has to be used
+    def get_brick_instance_changes(self, asset_ids: List[int]) -> Optional[Tuple[List[Brick], List[str], bool]]:
 
-        # get the corner IDs
-        top_left_corner_id = self.config.get("server", "extent_top_left_corner_id")
-        bot_right_corner_id = self.config.get("server", "extent_bottom_right_corner_id")
+        if not self.delta_sync:
+            return None
 
-        # create the request messages
-        create_top_left_msg = "{command}{scenario_id}/{asset_id}/{x}/{y}".format(
-            command=CREATE_ASSET_POS, scenario_id=self.scenario_id,
-            asset_id=top_left_corner_id, x=str(extent.x_min), y=str(extent.y_min)
-        )
+        changes_msg = CHANGES_ASSET_MSG.format(sync_token=self.sync_token,
+                                               asset_ids=",".join(str(asset_id) for asset_id in asset_ids))
+        response = self.send_message(changes_msg)
 
-        create_bot_right_msg = "{command}{scenario_id}/{asset_id}/{x}/{y}".format(
-            command=CREATE_ASSET_POS, scenario_id=self.scenario_id,
-            asset_id=bot_right_corner_id, x=str(extent.x_max), y=str(extent.y_max)
-        )
+        if SYNC_TOKEN_STRING not in response:
 
-        # send the messages
-        tl_ret = self.send_message(create_top_left_msg)
-        br_ret = self.send_message(create_bot_right_msg)
+            # an empty answer means the server could not be reached, any other one that it does not know change tokens
+            if not response:
+                return [], [], False
 
-        # log warning if extent corners could not be updated
-        # FIXME: rework protocol
-        if ((not self.check_status_code_200(tl_ret.status_code))
-                or (not self.check_status_code_200(br_ret.status_code))):
-            logger.warning("Could not update main map extent on server")
+            logger.warning("the server does not support change tokens, fetching all stored instances from now on")
+            self.delta_sync = False
+            return None
+
+        changed_bricks = [self.create_stored_instance(asset["asset_id"], assetpos_id, asset["position"])
+                          for assetpos_id, asset in response.get(CHANGED_STRING, {}).items()]
+        removed_assetpos_ids = [str(assetpos_id) for assetpos_id in response.get(REMOVED_STRING, [])]
+
+        self.sync_token = response[SYNC_TOKEN_STRING]
+        return changed_bricks, removed_assetpos_ids, response.get(COMPLETE_STRING, False)
+
+    # creates a virtual brick for an asset stored on the server
+    def create_stored_instance(self, asset_id, assetpos_id, position) -> Brick:
+
+        # Create a brick instance
+        stored_instance = Brick(None, None, None, None)
+
+        # Get the map position of the player
+        stored_instance.map_pos_x = position[0]
+        stored_instance.map_pos_y = position[1]
+
+        shape = None
+        color = None
+        try:
+            # Map a shape and color using known asset_id
+            shape_color = self.config.get("stored_instances", str(asset_id))
+            shape = shape_color.split(', ')[0]
+            color = shape_color.split(', ')[1]
+        except:
+            logger.info("Mapping of color and shape for asset_id {} is not possible".format(str(asset_id)))
+
+        # Add missing properties
+        stored_instance.shape = shape
+        stored_instance.color = color
+        stored_instance.asset_id = asset_id
+        stored_instance.assetpos_id = assetpos_id
+        stored_instance.status = BrickStatus.EXTERNAL_BRICK
+
+        # Calculate map position of a brick
+        Extent.calc_local_pos(stored_instance, self.extent_tracker.board,
+                              self.extent_tracker.map_extent)
+
+        return stored_instance
+
+    # initiates corner point update of the given main map extent on the server
+    # FIXME: rework protocol
+    #  the corners were created with CREATE_ASSET_POS http requests which have no websocket counterpart yet
+    #  (extent_top_left_corner_id and extent_bottom_right_corner_id in the server config)
+    def update_extent_info(self, extent: Extent):
+        logger.warning("Could not update main map extent {} on server, "
+                       "the websocket protocol has no message for it yet".format(extent))
 
     # checks how much energy a given asset type contributes
     # FIXME: this has to be generalized to work with various game objects
@@ -227,11 +364,11 @@ class Communicator:
 
         # check if request successful
         # FIXME: rework protocol
-        if not self.check_status_code_200(contrib_return.status_code):
+        if 'total_energy_contribution' not in contrib_return:
             raise ConnectionError("Bad Request: {}".format(get_asset_contrib_msg))
 
         # return energy contribution
-        return json.loads(contrib_return.text)['total_energy_contribution']
+        return contrib_return['total_energy_contribution']
 
     # check how much energy a given asset type should contribute
     # FIXME: this has to be generalized to work with various game objects
@@ -246,6 +383,8 @@ class Communicator:
 
         # check if request successful
         # FIXME: rework protocol
+        if 'energy_target' not in target_return:
+            raise ConnectionError("Bad Request: {}".format(get_asset_target_msg))
 
         # return energy target
-        return json.loads(target_return.text)['energy_target']
+        return target_return['energy_target']
@@ -21,7 +21,7 @@ class Configurator:
     def __init__(self, configfile="config.json"):
 
         # Load inital config data
-        self.config_file = configfile
+        self.__config_file = configfile
         self.refresh()
 
     # reload configuration file
@@ -0,0 +1,111 @@
+import threading
+import logging
+import numpy as np
+
+# enable logger
+logger = logging.getLogger(__name__)
+
+# number of preallocated frames
+# one is read by the consumer, one holds the latest frame and one is written by the producer
+FRAME_BUFFER_SIZE = 3
+
+
+# FrameBuffer class
+# bounded ring buffer of preallocated color and depth frames shared by the capture thread and the main loop
+# the consumer always gets the latest complete frame, older frames which were not consumed in time are dropped
+class FrameBuffer:
+
+    def __init__(self, size=FRAME_BUFFER_SIZE):
+
+        self.size = size
+        self.color_slots = [None] * size
+        self.depth_slots = [None] * size
+        self.depth_written = [False] * size
+
+        self.condition = threading.Condition()
+        self.closed = False
+
+        # slot indices of the last written, the latest complete and the currently read frame
+        self.written = size - 1
+        self.latest = None
+        self.reading = None
+
+        # count written and consumed frames to recognize new and dropped frames
+        self.written_frames_number = 0
+        self.consumed_frames_number = 0
+        self.dropped_frames_number = 0
+
+    # copies the given images into a free slot and marks it as the latest frame
+    # the images are copied since the camera sdk reuses its frame memory
+    # depth_image may be None if the depth is not needed for this frame
+    def write(self, color_image, depth_image=None):
+
+        # find a slot which is neither the latest frame nor read at the moment
+        with self.condition:
+            slot = next(
+                (self.written + offset) % self.size for offset in range(1, self.size + 1)
+                if (self.written + offset) % self.size not in (self.latest, self.reading)
+            )
+
+        # preallocate the slot on first use or if the frame size changed
+        self.color_slots[slot] = FrameBuffer.copy_into(self.color_slots[slot], color_image)
+        self.depth_slots[slot] = FrameBuffer.copy_into(self.depth_slots[slot], depth_image)
+        self.depth_written[slot] = depth_image is not None
+
+        with self.condition:
+
+            # the previous latest frame has never been read
+            if self.latest is not None and self.written_frames_number > self.consumed_frames_number:
+                self.dropped_frames_number += 1
+
+            self.written = slot
+            self.latest = slot
+            self.written_frames_number += 1
+            self.condition.notify_all()
+
+    # waits for a frame newer than the last consumed one and returns its color and depth image
+    # the returned images stay valid until the next call
+    # the depth image is None if it was not written for this frame
+    # returns None, None if the buffer was closed or the timeout expired
+    def read_latest(self, timeout=None):
+
+        with self.condition:
+            self.reading = None
+
+            self.condition.wait_for(
+                lambda: self.written_frames_number > self.consumed_frames_number or self.closed,
+                timeout
+            )
+
+            if self.written_frames_number == self.consumed_frames_number:
+                return None, None
+
+            self.reading = self.latest
+            self.consumed_frames_number = self.written_frames_number
+
+            depth_image = self.depth_slots[self.reading] if self.depth_written[self.reading] else None
+            return self.color_slots[self.reading], depth_image
+
+    # wakes up all waiting consumers, no more frames will be returned
+    def close(self):
+
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+        logger.info("closed frame buffer, dropped frames: {}".format(self.dropped_frames_number))
+
+    # copies the source image into the target buffer and returns it
+    # the target buffer is only allocated if it does not fit the image
+    # if there is no source image the target buffer is kept for later frames
+    @staticmethod
+    def copy_into(target, image):
+
+        if image is None:
+            return target
+
+        if target is None or target.shape != image.shape or target.dtype != image.dtype:
+            target = np.empty_like(image)
+
+        np.copyto(target, image)
+        return target
@@ -54,6 +54,9 @@ class Brick:
         self.shape: BrickShape = shape
         self.color: BrickColor = color
         self.status: BrickStatus = BrickStatus.CANDIDATE_BRICK
+        # the id of the track this brick started, set by the tracker if the brick is tracked
+        # candidates in the following frames are associated with the track and do not get an id
+        self.track_id: Optional[int] = None
         # these values will ONLY be set if the brick status is EXTERNAL_BRICK
         self.map_pos_x: Optional[float] = None
         self.map_pos_y: Optional[float] = None
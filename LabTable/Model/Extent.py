@@ -207,6 +207,31 @@ class Extent:
 
         return Vector(x, y)
 
+    # maps an array of points (one x, y row per point) from one extent to another
+    # equal to remap_point for every point, but computed in one vectorized step
+    @staticmethod
+    def remap_points(points: np.ndarray, old_extent: 'Extent', new_extent: 'Extent') -> np.ndarray:
+
+        points = np.array(points, dtype=np.float64).reshape(-1, 2)
+
+        if old_extent is None or new_extent is None:
+            logger.warning("Could not remap the points")
+
+        else:
+            old_size = np.array([old_extent.get_width(), old_extent.get_height()], dtype=np.float64)
+            new_size = np.array([new_extent.get_width(), new_extent.get_height()], dtype=np.float64)
+
+            points -= (old_extent.x_min, old_extent.y_min)
+            points /= old_size
+            points *= new_size
+
+            if new_extent.y_inverted != old_extent.y_inverted:
+                points[:, 1] = new_size[1] - points[:, 1]
+
+            points += (new_extent.x_min, new_extent.y_min)
+
+        return points
+
     #                  +----------------------------+
     #                  |                            |
     # +----+        \  |                            |
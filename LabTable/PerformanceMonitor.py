@@ -0,0 +1,131 @@
+import csv
+import time
+import logging
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Dict, List
+import numpy as np
+
+from .Configurator import Configurator
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# percentiles shown in the statistics
+PERCENTILES = [50, 90, 99]
+
+# seconds after which the overlay lines are recomputed
+OVERLAY_REFRESH_SECONDS = 0.5
+
+
+# PerformanceMonitor class
+# measures the duration of named spans of the main loop (capture, rectify, beamer redraw, ...)
+# keeps a rolling window of the last durations of every span and additional gauge values (e.g. candidates number)
+# the statistics can be shown on the debug channel and are periodically written to the log and optionally a csv file
+class PerformanceMonitor:
+
+    def __init__(self, config: Configurator):
+
+        self.enabled: bool = config.get("performance_monitor", "enabled")
+        self.window_size = config.get("performance_monitor", "window_size")
+        self.dump_interval = config.get("performance_monitor", "dump_interval")
+        self.csv_path = config.get("performance_monitor", "csv_path")
+
+        # durations in milliseconds by span name, in order of the first measurement
+        self.durations: Dict[str, deque] = OrderedDict()
+        self.gauges: Dict[str, float] = OrderedDict()
+
+        self.frames_number = 0
+        self.last_dump = time.perf_counter()
+        self.last_overlay = 0
+        self.overlay_lines: List[str] = []
+
+    # measures the duration of the enclosed code block
+    # usage: with performance_monitor.span("rectify"): ...
+    @contextmanager
+    def span(self, name: str):
+
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, 1000 * (time.perf_counter() - start))
+
+    # adds a measured duration (in milliseconds) to the rolling window of the span
+    def record(self, name: str, milliseconds: float):
+
+        if name not in self.durations:
+            self.durations[name] = deque(maxlen=self.window_size)
+
+        self.durations[name].append(milliseconds)
+
+    # sets the current value of a gauge
+    def set_gauge(self, name: str, value: float):
+        self.gauges[name] = value
+
+    # returns the percentiles, the mean and the maximum of the durations of a span
+    def get_statistics(self, name: str) -> List[float]:
+
+        values = np.array(self.durations[name])
+        return list(np.percentile(values, PERCENTILES)) + [values.mean(), values.max()]
+
+    # returns one text line per span and gauge, e.g. "rectify: 3.1 ms (p90 4.2)"
+    def get_summary_lines(self) -> List[str]:
+
+        lines = []
+        for name, durations in self.durations.items():
+            if durations:
+                median, p90 = np.percentile(np.array(durations), [50, 90])
+                lines.append("{}: {:.1f} ms (p90 {:.1f})".format(name, median, p90))
+
+        for name, value in self.gauges.items():
+            lines.append("{}: {}".format(name, value))
+
+        return lines
+
+    # returns the summary lines for the debug overlay, they are recomputed only every few frames
+    def get_overlay_lines(self) -> List[str]:
+
+        now = time.perf_counter()
+        if self.enabled and now - self.last_overlay > OVERLAY_REFRESH_SECONDS:
+            self.overlay_lines = self.get_summary_lines()
+            self.last_overlay = now
+
+        return self.overlay_lines
+
+    # call once per frame, dumps the statistics if the dump interval passed
+    def tick(self):
+
+        self.frames_number += 1
+
+        if self.enabled and self.dump_interval is not None \
+                and time.perf_counter() - self.last_dump > self.dump_interval:
+            self.dump()
+
+    # writes the statistics of all spans to the log and (if configured) appends them to the csv file
+    def dump(self):
+
+        now = time.perf_counter()
+        fps = self.frames_number / (now - self.last_dump)
+        self.last_dump = now
+        self.frames_number = 0
+
+        logger.info("performance: {:.1f} fps, {}".format(fps, ", ".join(self.get_summary_lines())))
+
+        if self.csv_path:
+            with open(self.csv_path, "a", newline="") as csv_file:
+                writer = csv.writer(csv_file)
+                timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+
+                for name in self.durations:
+                    if self.durations[name]:
+                        writer.writerow([timestamp, name] + ["{:.3f}".format(v) for v in self.get_statistics(name)])
+
+                for name, value in self.gauges.items():
+                    writer.writerow([timestamp, name, value])
+
+                writer.writerow([timestamp, "fps", "{:.3f}".format(fps)])
@@ -0,0 +1,169 @@
+import logging
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+from LabTable.Model.Brick import Brick
+from .Communicator import Communicator
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# kinds of remote commands
+CREATE_COMMAND = "create"
+REMOVE_COMMAND = "remove"
+
+# a remote command: (kind, brick, argument)
+# the argument is the create message or the assetpos_id to remove (None if the brick is still being created)
+# both are read from the brick when the command is queued, so the worker never accesses the bricks
+RemoteCommand = Tuple[str, Brick, Union[str, int, None]]
+
+
+# RemoteCommandQueue class
+# stands in for the Communicator where the tracker creates and removes remote brick instances
+# the requests are sent by a background worker, so the frame loop does not wait for the server
+# the worker collects the commands queued within a short window, drops creates which are removed in the same window
+# and sends the rest together (see Communicator.send_messages)
+# the answers are handled (setting assetpos ids, setting bricks outdated, updating progress bars)
+# when apply_results is called on the thread which owns the bricks
+class RemoteCommandQueue:
+
+    def __init__(self, communicator: Communicator, batch_window: float = 0):
+        self.communicator = communicator
+
+        # seconds the worker waits for further commands after the first one before sending them
+        self.batch_window = batch_window
+
+        # commands waiting to be sent
+        self.commands: 'queue.Queue[Optional[RemoteCommand]]' = queue.Queue()
+
+        # commands waiting for their answers to be handled: (kind, brick, answer)
+        self.results = queue.Queue()
+
+        # number of creates dropped together with their removes
+        self.cancelled_number = 0
+
+        # the assetpos ids of the created bricks (by brick object id) which were not removed yet
+        # only used by the worker, so a remove can be sent before the main thread applied the create answer
+        self.created_assetpos_ids: Dict[int, Optional[int]] = {}
+
+        self.worker = threading.Thread(target=self.run, name="remote command queue", daemon=True)
+        self.worker.start()
+
+    # queues the creation of a remote brick instance
+    # the geographical position is computed right away, since the map extent might change until the request is sent
+    def create_remote_brick_instance(self, brick: Brick):
+        self.communicator.prepare_remote_brick_instance(brick)
+        self.commands.put((CREATE_COMMAND, brick, self.communicator.get_create_message(brick)))
+
+    # queues the removal of a remote brick instance
+    # it is sent after a queued creation of the brick, so it uses the assetpos_id from its answer
+    def remove_remote_brick_instance(self, brick: Brick):
+        self.commands.put((REMOVE_COMMAND, brick, brick.assetpos_id))
+
+    def get_stored_brick_instances(self, asset_id):
+        return self.communicator.get_stored_brick_instances(asset_id)
+
+    def get_all_stored_brick_instances(self, asset_ids: List[int]) -> List[Brick]:
+        return self.communicator.get_all_stored_brick_instances(asset_ids)
+
+    def get_brick_instance_changes(self, asset_ids: List[int]) -> Optional[Tuple[List[Brick], List[str], bool]]:
+        return self.communicator.get_brick_instance_changes(asset_ids)
+
+    # sends the queued commands until None is queued
+    def run(self):
+
+        running = True
+        while running:
+            command = self.commands.get()
+            if command is None:
+                break
+
+            # collect the commands of the batch window
+            commands = [command]
+            window_end = time.perf_counter() + self.batch_window
+            while True:
+                try:
+                    command = self.commands.get(timeout=max(0., window_end - time.perf_counter()))
+                except queue.Empty:
+                    break
+
+                if command is None:
+                    running = False
+                    break
+                commands.append(command)
+
+            try:
+                self.send(self.coalesce(commands))
+            except Exception as error:
+                logger.exception("could not send remote commands: {}".format(error))
+
+    # removes creates which are followed by a remove of the same brick together with that remove
+    def coalesce(self, commands: List[RemoteCommand]) -> List[RemoteCommand]:
+
+        coalesced_commands: List[Optional[RemoteCommand]] = []
+        create_indices = {}
+
+        for kind, brick, argument in commands:
+
+            if kind == REMOVE_COMMAND and id(brick) in create_indices:
+                coalesced_commands[create_indices.pop(id(brick))] = None
+                self.cancelled_number += 1
+                logger.debug("dropped create and remove of {}".format(brick))
+                continue
+
+            if kind == CREATE_COMMAND:
+                create_indices[id(brick)] = len(coalesced_commands)
+            coalesced_commands.append((kind, brick, argument))
+
+        return [command for command in coalesced_commands if command is not None]
+
+    # sends the commands and queues their answers
+    # a remove of a brick which was queued before the answer to its create arrived
+    # gets the assetpos_id from the answers to the previous creates
+    def send(self, commands: List[RemoteCommand]):
+
+        if not commands:
+            return
+
+        messages = []
+        for kind, brick, argument in commands:
+            if kind == CREATE_COMMAND:
+                messages.append(argument)
+            else:
+                assetpos_id = argument if argument is not None else self.created_assetpos_ids.get(id(brick))
+                messages.append(self.communicator.get_remove_message(assetpos_id))
+
+        for (kind, brick, argument), answer in zip(commands, self.communicator.send_messages(messages)):
+            if kind == CREATE_COMMAND:
+                self.created_assetpos_ids[id(brick)] = self.communicator.get_created_assetpos_id(answer)
+            else:
+                self.created_assetpos_ids.pop(id(brick), None)
+            self.results.put((kind, brick, answer))
+
+    # handles the answers which arrived since the last call and returns their number
+    def apply_results(self) -> int:
+
+        results_number = 0
+        while True:
+            try:
+                kind, brick, answer = self.results.get_nowait()
+            except queue.Empty:
+                return results_number
+
+            if kind == CREATE_COMMAND:
+                self.communicator.apply_create_response(brick, answer)
+                self.communicator.handle_create_answer(brick, answer)
+            else:
+                self.communicator.handle_remove_answer(brick, answer)
+            results_number += 1
+
+    # returns the number of commands which were not sent yet
+    def get_pending_number(self) -> int:
+        return self.commands.qsize()
+
+    # sends the remaining commands and stops the worker
+    def close(self, timeout=None):
+        self.commands.put(None)
+        self.worker.join(timeout)
@@ -3,8 +3,12 @@
 # FIXME: we might abstract this further so alternate webcams could be used
 import pyrealsense2 as rs  # FIXME: CG: this currently requires python 3.6
 import logging
+import threading
 import numpy as np
 
+from .FrameBuffer import FrameBuffer
+from .CaptureThread import CaptureThread
+
 # enable logger
 logger = logging.getLogger(__name__)
 
@@ -21,8 +25,12 @@ class TableInputStream:
     height = None
 
     # intermediate storage of actual frames
-    color_frame = None
-    aligned_depth_frame = None
+    color_image = None
+    depth_image = None
+    depth_image_3d = None
+
+    # seconds to wait for a new frame from the capture thread
+    FRAME_TIMEOUT = 5
 
     # initialize the input stream (from live camera or bag file)
     def __init__(self, config, board, usestream=None):
@@ -36,8 +44,13 @@ class TableInputStream:
 
         self.board = board
 
-        # FIXME: missing frames when using videostream or too slow processing
+        # frames are captured in a separate thread and the main loop always takes the latest one
+        # so a slow frame does not lead to missing frames in the realsense pipeline
         # https://github.com/IntelRealSense/librealsense/issues/2216
+        self.frame_buffer = FrameBuffer()
+
+        # the depth frame is only aligned and stored if it is needed in the current program stage
+        self.depth_required = threading.Event()
 
         # Use recorded depth and color streams and its configuration
         # If problems with colors occur, check bgr/rgb channels configurations
@@ -63,46 +76,77 @@ class TableInputStream:
         self.depth_scale = depth_sensor.get_depth_scale()
         logger.debug("Depth Scale is: {}".format(self.depth_scale))
 
-    def get_frame(self):
-
-        # Wait for depth and color frames
-        frames = self.pipeline.wait_for_frames()
+        # the playback of a recorded stream tells the capture thread when the recording ended
+        playback = self.profile.get_device().as_playback() if usestream is not None else None
+
+        self.capture_thread = CaptureThread(
+            self.pipeline,
+            self.alignment_stream,
+            self.frame_buffer,
+            self.depth_required,
+            playback
+        )
+
+    # starts capturing frames in the background
+    def start(self):
+        self.capture_thread.start()
+
+    # returns false once capturing stopped, then no more frames will be returned
+    def is_capturing(self) -> bool:
+        return not self.frame_buffer.closed
+
+    # enables or disables the alignment of depth frames for the following frames
+    def set_depth_required(self, depth_required: bool):
+        if depth_required:
+            self.depth_required.set()
+        else:
+            self.depth_required.clear()
 
-        # Align the depth frame to color frame
-        aligned_frames = self.alignment_stream.process(frames)
+    # returns the latest captured color image, older frames not consumed in time are dropped
+    # the returned image is only valid until the next call
+    # returns None if no new frame was captured
+    def get_frame(self):
 
-        # Get aligned frames (depth images)
-        self.aligned_depth_frame = aligned_frames.get_depth_frame()
-        self.color_frame = aligned_frames.get_color_frame()
+        # Wait for the latest color and (if required) aligned depth images
+        color_image, depth_image = self.frame_buffer.read_latest(TableInputStream.FRAME_TIMEOUT)
 
         # New frame log information
         # logger.info("!! new frame started")
 
-        # Validate that both frames are valid
-        if self.aligned_depth_frame and self.color_frame:
-            # Convert images to numpy arrays
-            depth_image = np.asanyarray(self.aligned_depth_frame.get_data())
-            color_image = np.asanyarray(self.color_frame.get_data())
+        # TODO: automatically change contrast!
+        # color_image = cv2.convertScaleAbs(color_image, 2.2, 2)
+        # cv2.imshow("mask", color_image)
 
-            # TODO: automatically change contrast!
-            # color_image = cv2.convertScaleAbs(color_image, 2.2, 2)
-            # cv2.imshow("mask", color_image)
+        self.color_image = color_image
+        self.depth_image = depth_image
+        self.depth_image_3d = None
+
+        return color_image
+
+    # returns the depth image of the latest frame with 3 channels
+    # it is only computed on demand and only available if depth was required for the frame
+    def get_depth_image_3d(self):
+
+        if self.depth_image_3d is None and self.depth_image is not None:
 
             # Change background regarding clip_dist to black
             # Depth image is 1 channel, color is 3 channels
-            depth_image_3d = np.dstack((depth_image, depth_image, depth_image))
+            self.depth_image_3d = np.dstack((self.depth_image, self.depth_image, self.depth_image))
 
-            return depth_image_3d, color_image
-
-        else:
-            return None, None
+        return self.depth_image_3d
 
     # Get the depth information from the middle of the frame
     # and save it if it is not 0
     def get_distance_to_board(self):
 
+        # depth is not available if it was not required when the frame was captured
+        if self.depth_image is None:
+            logger.debug("No depth information in the current frame")
+            return
+
         # Get the depth information from the middle of the frame
-        board_distance = self.aligned_depth_frame.get_distance(int(self.width/2), int(self.height/2)) / self.depth_scale
+        # the raw depth value equals the distance in meters divided by the depth scale
+        board_distance = float(self.depth_image[int(self.height/2), int(self.width/2)])
 
         # if not 0 -> happen when the depth data
         # is not correctly computed
@@ -111,5 +155,8 @@ class TableInputStream:
         logger.debug("Distance to the board is: {}".format(self.board.distance))
 
     def close(self):
-        # Stop streaming
+        # Stop capturing and streaming
+        self.capture_thread.stop()
+        if self.capture_thread.is_alive():
+            self.capture_thread.join()
         self.pipeline.stop()
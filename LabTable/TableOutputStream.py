@@ -12,19 +12,21 @@ from .TableUI.MainMap import MainMap
 from .TableUI.UIElements.UIElement import UIElement
 from LabTable.Model.Brick import Brick, BrickColor, BrickShape, BrickStatus
 from .TableUI.ImageHandler import ImageHandler
+from .TableUI.BeamerCompositor import BeamerCompositor, VIRTUAL_BRICK_ALPHA
 from .TableUI.BrickIcon import ExternalBrickIcon, InternalBrickIcon
+from .TableUI.IconAtlas import IconAtlas
 from .TableUI.CallbackManager import CallbackManager
 from .ExtentTracker import ExtentTracker
 from LabTable.Model.Extent import Extent
 from LabTable.Model.Board import Board
 from .SchedulerThread import SchedulerThread
+from .PerformanceMonitor import PerformanceMonitor
 
 # enable logger
 logger = logging.getLogger(__name__)
 
 # drawing constants
 BRICK_DISPLAY_SIZE = 10
-VIRTUAL_BRICK_ALPHA = 0.3
 BRICK_LABEL_OFFSET = 10
 BLUE = (255, 0, 0)
 GREEN = (0, 255, 0)
@@ -80,6 +82,7 @@ class TableOutputStream:
                  board: Board,
                  program_stage: CurrentProgramStage,
                  server_thread: SchedulerThread,
+                 performance_monitor: PerformanceMonitor,
                  video_output_name=None):
 
         self.config = config
@@ -88,6 +91,7 @@ class TableOutputStream:
         self.board = board
         self.program_stage = program_stage
         self.server_thread = server_thread
+        self.performance_monitor = performance_monitor
 
         self.active_channel = TableOutputChannel.CHANNEL_BOARD_DETECTION
         self.active_window = TableOutputStream.WINDOW_NAME_DEBUG  # TODO: implement window handling
@@ -122,8 +126,17 @@ class TableOutputStream:
         else:
             self.video_handler = None
 
+        self.video_width = config.get('resolution', 'width')
+        self.video_height = config.get('resolution', 'height')
+
         self.last_frame = None
 
+        # the beamer frame is composed of a cached base layer (map, external virtual bricks and ui)
+        # and the remaining bricks, which are only redrawn where they changed
+        self.compositor = BeamerCompositor()
+        self.ui_appearance_version = None
+        self.external_virtual_brick_keys = None
+
         # set ui_root and map handler, create empty variable for tracker
         self.ui_root = ui_root
         self.map_handler = map_handler
@@ -156,6 +169,9 @@ class TableOutputStream:
         for rule, icon_name in external_icons.items():
             self.external_icon_list.append(ExternalBrickIcon(rule, image_handler.load_image(icon_name)))
 
+        self.icon_atlas = IconAtlas(
+            self.internal_icon_list, self.external_icon_list, self.brick_outdated, self.brick_unknown)
+
     # fetches the correct monitor for the beamer output and writes it's data to the ConfigManager
     @staticmethod
     def set_beamer_config_info(config):
@@ -178,6 +194,16 @@ class TableOutputStream:
     def write_to_file(self, frame):
         # TODO: shouldn't we be able to select which channel we want to write to the file?
         if self.video_handler:
+
+            # the video has the camera resolution, smaller frames (e.g. the board sized region of interest)
+            # are written into the upper left corner of a black frame
+            if frame.shape[:2] != (self.video_height, self.video_width):
+                video_frame = np.zeros((self.video_height, self.video_width, 3), np.uint8)
+                height = min(frame.shape[0], self.video_height)
+                width = min(frame.shape[1], self.video_width)
+                video_frame[0:height, 0:width] = frame[0:height, 0:width]
+                frame = video_frame
+
             self.video_handler.write(frame)
 
     # write the frame into a window
@@ -230,7 +256,20 @@ class TableOutputStream:
                          + "\nnumber of found qr-codes: " + str(self.board.found_codes_number)
 
         # Add text line by line
-        for line_number, line in enumerate(text.split("\n")):
+        lines = text.split("\n")
+        TableOutputStream.add_text_lines(frame, lines)
+
+        # Add the stage timings below
+        TableOutputStream.add_text_lines(frame, self.performance_monitor.get_overlay_lines(), len(lines))
+
+    # Add the live stage timings to the given frame
+    def add_performance_information(self, frame):
+        TableOutputStream.add_text_lines(frame, self.performance_monitor.get_overlay_lines())
+
+    # Add text lines to the upper left corner of the frame, starting with the given line number
+    @staticmethod
+    def add_text_lines(frame, lines, first_line_number=0):
+        for line_number, line in enumerate(lines, first_line_number):
             position_y = POSITION_Y + line_number * LINE_HEIGHT
             cv2.putText(frame, line, (POSITION_X, position_y),
                         cv2.FONT_HERSHEY_SIMPLEX, DEBUG_INFORMATION_FONT_SIZE, GREEN, FONT_THICKNESS)
@@ -239,10 +278,12 @@ class TableOutputStream:
     # recognizes and handles button presses
     def update(self, program_stage: CurrentProgramStage) -> bool:
         # update beamer image if necessary
-        self.redraw_beamer_image(program_stage)
+        with self.performance_monitor.span("beamer redraw"):
+            self.redraw_beamer_image(program_stage)
 
         # check if key pressed
-        key = cv2.waitKeyEx(1)
+        with self.performance_monitor.span("wait key"):
+            key = cv2.waitKeyEx(1)
 
         self.callback_manager.call_key_action(key)
 
@@ -304,22 +345,36 @@ class TableOutputStream:
     # called every frame when in ProgramStage EVALUATION or PLANNING
     def redraw_brick_detection(self):
         # check flags if any part of the frame has changed
+        ui_changed = self.config.get("ui_settings", "ui_refreshed") \
+            or self.ui_appearance_version != UIElement.appearance_version
+
         if self.config.get("map_settings", 'map_refreshed') \
-                or self.config.get("ui_settings", "ui_refreshed") \
+                or ui_changed \
                 or Tracker.BRICKS_REFRESHED \
                 or TableOutputStream.MOUSE_BRICKS_REFRESHED:
 
-            # get map image from map handler
-            frame = self.map_handler.get_map_image().copy()
+            # external virtual bricks are drawn behind the ui, so the base layer is rebuilt if they changed
+            external_virtual_brick_keys = [BeamerCompositor.get_item_key(item)
+                                           for item in self.get_external_virtual_brick_items()]
+
+            if self.config.get("map_settings", 'map_refreshed') or ui_changed or self.compositor.base is None \
+                    or external_virtual_brick_keys != self.external_virtual_brick_keys:
 
-            # render virtual external bricks on top of map
-            self.render_external_virtual_bricks(frame)
+                # get a copy of the map image from map handler
+                base = self.map_handler.get_map_image()
 
-            # render ui over map and external virtual bricks
-            self.ui_root.draw(frame)
+                # render virtual external bricks on top of map
+                self.render_external_virtual_bricks(base)
 
-            # render remaining bricks in front of ui
-            self.render_bricks(frame)
+                # render ui over map and external virtual bricks
+                self.ui_root.draw(base)
+
+                self.compositor.set_base(base)
+                self.ui_appearance_version = UIElement.appearance_version
+                self.external_virtual_brick_keys = external_virtual_brick_keys
+
+            # render remaining bricks in front of ui, only the changed brick areas are redrawn
+            frame = self.compositor.compose(self.get_brick_items())
 
             # display and save frame
             cv2.imshow(TableOutputStream.WINDOW_NAME_BEAMER, frame)
@@ -337,58 +392,42 @@ class TableOutputStream:
         # render bricks on top of transparent overlay_target
         overlay_target = render_target.copy()
 
-        # filter external bricks out of the virtual brick list and iterate over them
-        for brick in filter(lambda b: b.status == BrickStatus.EXTERNAL_BRICK, self.tracker.virtual_bricks):
-            self.render_brick(brick, overlay_target, True)
+        # draw the external virtual bricks to the overlay_target
+        for icon, position, virtual in self.get_external_virtual_brick_items():
+            ImageHandler.img_on_background(overlay_target, icon, position)
 
         # add overlay_target to render_target with alpha_value
         cv2.addWeighted(overlay_target, VIRTUAL_BRICK_ALPHA, render_target, 1 - VIRTUAL_BRICK_ALPHA, 0, render_target)
 
-    # renders all bricks except external virtual ones since those get rendered earlier
-    def render_bricks(self, render_target):
-        # render all confirmed bricks without transparency
-        for brick in self.tracker.confirmed_bricks:
-            self.render_brick(brick, render_target)
+    # returns the icons and beamer positions of the external virtual bricks
+    def get_external_virtual_brick_items(self):
+        return self.get_brick_item_batch(
+            [brick for brick in self.tracker.virtual_bricks if brick.status == BrickStatus.EXTERNAL_BRICK], True)
 
-        # render virtual bricks on top of transparent overlay_target
-        overlay_target = render_target.copy()
-        # iterate over all non-external virtual bricks and draw them to the overlay_target
-        for brick in list(filter(lambda b: b.status != BrickStatus.EXTERNAL_BRICK, self.tracker.virtual_bricks)):
-            self.render_brick(brick, overlay_target, True)
+    # returns the icons and beamer positions of all bricks except external virtual ones
+    # since those get rendered earlier
+    # confirmed bricks are drawn without transparency, the remaining virtual bricks transparent on top of them
+    def get_brick_items(self):
+        return self.get_brick_item_batch(list(self.tracker.confirmed_bricks)) \
+            + self.get_brick_item_batch(
+                [brick for brick in self.tracker.virtual_bricks if brick.status != BrickStatus.EXTERNAL_BRICK], True)
 
-        # add overlay_target to render_target with alpha_value
-        cv2.addWeighted(overlay_target, VIRTUAL_BRICK_ALPHA, render_target, 1 - VIRTUAL_BRICK_ALPHA, 0, render_target)
+    # returns the icons and beamer positions of a list of bricks
+    # all positions are remapped at once, so no remapped brick copies are needed
+    def get_brick_item_batch(self, bricks: List[Brick], virtual=False):
 
-    # renders a given brick onto a given render target
-    # fetches the correct icon with get_brick_icon
-    def render_brick(self, brick, render_target, virtual=False):
-        b = Extent.remap_brick(brick, self.extent_tracker.board, self.extent_tracker.beamer)
-        pos = (int(b.centroid_x), int(b.centroid_y))
-        icon = self.get_brick_icon(brick, virtual)
+        if not bricks:
+            return []
 
-        ImageHandler.img_on_background(render_target, icon, pos)
+        positions = Extent.remap_points([[brick.centroid_x, brick.centroid_y] for brick in bricks],
+                                        self.extent_tracker.board, self.extent_tracker.beamer)
+
+        return [(self.get_brick_icon(brick, virtual), (int(x), int(y)), virtual)
+                for brick, (x, y) in zip(bricks, positions.tolist())]
 
     # returns the correct brick icon for any given brick
     def get_brick_icon(self, brick, virtual):
-
-        # return x icon if brick is outdated
-        if brick.status == BrickStatus.OUTDATED_BRICK:
-            return self.brick_outdated
-
-        # search for correct internal icon and return it if brick is internal
-        elif brick.status == BrickStatus.INTERNAL_BRICK:
-            for icon_candidate in self.internal_icon_list:
-                if icon_candidate.matches(brick):
-                    return icon_candidate.icon
-
-        # search for correct internal icon and return it if brick is external
-        elif brick.status == BrickStatus.EXTERNAL_BRICK:
-            for icon_candidate in self.external_icon_list:
-                if icon_candidate.matches(brick, virtual):
-                    return icon_candidate.icon
-
-        # return "unknown brick" icon if no icon matches
-        return self.brick_unknown
+        return self.icon_atlas.get_icon(brick, virtual)
 
     # closing the outputstream if it is defined
     def close(self):
@@ -0,0 +1,117 @@
+from typing import Dict, List, Tuple
+from collections import Counter
+import numpy as np
+import cv2
+
+from .ImageHandler import ImageHandler
+
+# transparency of virtual brick icons
+VIRTUAL_BRICK_ALPHA = 0.3
+
+# a brick icon drawn on top of the base layer: (icon dictionary, position on the beamer, virtual)
+BrickLayerItem = Tuple[Dict, Tuple[int, int], bool]
+
+
+# BeamerCompositor class
+# composes the beamer frame from a cached base layer (map, external virtual bricks and ui)
+# and the brick icons drawn in front of it
+# if only bricks changed, only the areas of the changed icons are restored from the base layer and redrawn
+class BeamerCompositor:
+
+    def __init__(self):
+
+        self.base = None
+        self.frame = None
+
+        # the items currently drawn on the frame
+        self.items: List[BrickLayerItem] = []
+
+    # sets a new base layer, all items are drawn again with the next compose call
+    def set_base(self, base):
+
+        self.base = base
+        if self.frame is None or self.frame.shape != base.shape:
+            self.frame = base.copy()
+        else:
+            np.copyto(self.frame, base)
+
+        self.items = []
+
+    # draws the given items in front of the base layer and returns the frame
+    # opaque items are drawn first, virtual items are blended on top of them
+    def compose(self, items: List[BrickLayerItem]):
+
+        # only items which were added, removed, moved or changed their icon have to be redrawn
+        previous_items = Counter(BeamerCompositor.get_item_key(item) for item in self.items)
+        current_items = Counter(BeamerCompositor.get_item_key(item) for item in items)
+        changed_keys = (previous_items - current_items) + (current_items - previous_items)
+
+        changed_items = {BeamerCompositor.get_item_key(item): item for item in self.items + items}
+        dirty_areas = [self.get_item_area(changed_items[key]) for key in changed_keys]
+
+        for area in dirty_areas:
+            self.redraw_area(area, items)
+
+        self.items = list(items)
+        return self.frame
+
+    # restores an area from the base layer and draws all items overlapping it
+    def redraw_area(self, area, items: List[BrickLayerItem]):
+
+        x_min, y_min, x_max, y_max = area
+        if x_min >= x_max or y_min >= y_max:
+            return
+
+        region = self.frame[y_min:y_max, x_min:x_max]
+        np.copyto(region, self.base[y_min:y_max, x_min:x_max])
+
+        # draw the opaque items
+        for icon, position, virtual in items:
+            if not virtual:
+                BeamerCompositor.draw_icon(region, icon, position, area)
+
+        # draw the virtual items on top of a transparent overlay
+        virtual_items = [item for item in items if item[2]]
+        if virtual_items:
+            overlay = region.copy()
+            for icon, position, virtual in virtual_items:
+                BeamerCompositor.draw_icon(overlay, icon, position, area)
+
+            cv2.addWeighted(overlay, VIRTUAL_BRICK_ALPHA, region, 1 - VIRTUAL_BRICK_ALPHA, 0, region)
+
+    # draws an icon onto a region of the frame if it overlaps the area of the region
+    @staticmethod
+    def draw_icon(region, icon: Dict, position: Tuple[int, int], area):
+
+        x_min, y_min, x_max, y_max = area
+        icon_x_min, icon_y_min, icon_x_max, icon_y_max = BeamerCompositor.get_icon_area(icon, position)
+
+        if icon_x_min < x_max and x_min < icon_x_max and icon_y_min < y_max and y_min < icon_y_max:
+            ImageHandler.img_on_background(region, icon, (position[0] - x_min, position[1] - y_min))
+
+    # returns the area covered by an item clipped to the frame
+    def get_item_area(self, item: BrickLayerItem):
+
+        icon, position, virtual = item
+        x_min, y_min, x_max, y_max = BeamerCompositor.get_icon_area(icon, position)
+        height, width = self.frame.shape[:2]
+
+        return max(x_min, 0), max(y_min, 0), min(x_max, width), min(y_max, height)
+
+    # returns the area an icon covers if it is drawn at the given position
+    @staticmethod
+    def get_icon_area(icon: Dict, position: Tuple[int, int]):
+
+        x, y = position
+        if 'center' in icon:
+            x -= icon['center'][0]
+            y -= icon['center'][1]
+
+        height, width = icon['image'].shape[:2]
+        return x, y, x + width, y + height
+
+    # returns a key which is equal for items which look the same
+    @staticmethod
+    def get_item_key(item: BrickLayerItem):
+        icon, position, virtual = item
+        return id(icon), position, virtual
@@ -0,0 +1,59 @@
+from typing import Dict, List, Tuple
+
+from LabTable.Model.Brick import Brick, BrickStatus
+from .BrickIcon import ExternalBrickIcon, InternalBrickIcon
+
+
+# IconAtlas class
+# looks up the icon of a brick with a single dictionary access
+# the rules of the icon lists are only matched the first time a brick type appears,
+# the matched icon is then stored for the key (status, asset_id, color, shape, virtual)
+class IconAtlas:
+
+    def __init__(
+            self,
+            internal_icon_list: List[InternalBrickIcon],
+            external_icon_list: List[ExternalBrickIcon],
+            outdated_icon: Dict,
+            unknown_icon: Dict
+    ):
+        self.internal_icon_list = internal_icon_list
+        self.external_icon_list = external_icon_list
+        self.outdated_icon = outdated_icon
+        self.unknown_icon = unknown_icon
+
+        self.icons: Dict[Tuple, Dict] = {}
+
+    # returns the correct brick icon for any given brick
+    def get_icon(self, brick: Brick, virtual: bool) -> Dict:
+
+        key = (brick.status, brick.asset_id, brick.color, brick.shape, virtual)
+
+        icon = self.icons.get(key)
+        if icon is None:
+            icon = self.match_icon(brick, virtual)
+            self.icons[key] = icon
+
+        return icon
+
+    # searches the icon lists for the first icon whose rules match the brick
+    def match_icon(self, brick: Brick, virtual: bool) -> Dict:
+
+        # return x icon if brick is outdated
+        if brick.status == BrickStatus.OUTDATED_BRICK:
+            return self.outdated_icon
+
+        # search for correct internal icon and return it if brick is internal
+        elif brick.status == BrickStatus.INTERNAL_BRICK:
+            for icon_candidate in self.internal_icon_list:
+                if icon_candidate.matches(brick):
+                    return icon_candidate.icon
+
+        # search for correct external icon and return it if brick is external
+        elif brick.status == BrickStatus.EXTERNAL_BRICK:
+            for icon_candidate in self.external_icon_list:
+                if icon_candidate.matches(brick, virtual):
+                    return icon_candidate.icon
+
+        # return "unknown brick" icon if no icon matches
+        return self.unknown_icon
@@ -63,10 +63,55 @@ class ImageHandler:
 
         img = ImageHandler.ensure_alpha_channel(img)
 
-        # add image to dictionary and return
+        # add image to dictionary and prepare it for blending
         image_dict['image'] = img
+        ImageHandler.prepare_blending(image_dict)
         return image_dict
 
+    # stores the color channels of an image dictionary premultiplied with its alpha channel
+    # together with its transparency (255 - alpha) as uint16 and whether it is fully opaque or fully transparent
+    # so img_on_background does not have to compute them again for every draw call
+    @staticmethod
+    def prepare_blending(image_dict: Dict) -> Dict:
+
+        img = image_dict['image']
+        alpha = img[:, :, 3]
+
+        opaque = bool((alpha == 255).all())
+        transparent = not opaque and not alpha.any()
+
+        # a contiguous copy of the color channels is copied a lot faster than a view skipping the alpha channel
+        color = None
+        premultiplied = None
+        transparency = None
+        if opaque:
+            color = np.ascontiguousarray(img[:, :, 0:3])
+        elif not transparent:
+            # the alpha values are repeated for every color channel, broadcasting them is a lot slower
+            alpha = np.repeat(alpha[:, :, np.newaxis], 3, axis=2).astype(np.uint16)
+            premultiplied = img[:, :, 0:3] * alpha
+            transparency = 255 - alpha
+
+        image_dict['blending'] = {
+            'image': img,
+            'opaque': opaque,
+            'transparent': transparent,
+            'color': color,
+            'premultiplied': premultiplied,
+            'transparency': transparency
+        }
+        return image_dict['blending']
+
+    # returns the blending data of an image dictionary and prepares it if the image is new or was replaced
+    @staticmethod
+    def get_blending(image_dict: Dict) -> Dict:
+
+        blending = image_dict.get('blending')
+        if blending is None or blending['image'] is not image_dict['image']:
+            blending = ImageHandler.prepare_blending(image_dict)
+
+        return blending
+
     # draws an image onto a given background
     # both images must have an alpha channel
     # while im_back is a simple np array im_top must be a dictionary containing the image
@@ -97,15 +142,30 @@ class ImageHandler:
         top_end_x = max(min(top_w, bac_w - top_x), 0)
         top_end_y = max(min(top_h, bac_h - top_y), 0)
 
-        alpha = img[top_start_y:top_end_y, top_start_x:top_end_x, 3] / 255.0
+        if bac_start_x >= bac_end_x or bac_start_y >= bac_end_y:
+            return im_back
+
+        blending = ImageHandler.get_blending(im_top)
+        back = im_back[bac_start_y:bac_end_y, bac_start_x:bac_end_x]
+
+        # fully transparent icons change nothing, fully opaque icons are simply copied
+        if blending['transparent']:
+            return im_back
+
+        if blending['opaque']:
+            back[:, :, 0:3] = blending['color'][top_start_y:top_end_y, top_start_x:top_end_x]
+            if im_back.shape[2] == 4:
+                back[:, :, 3] = 255
+            return im_back
 
-        im_back[bac_start_y:bac_end_y, bac_start_x:bac_end_x, 0] = (1. - alpha) * im_back[bac_start_y:bac_end_y, bac_start_x:bac_end_x, 0] + alpha * img[top_start_y:top_end_y, top_start_x:top_end_x, 0]
-        im_back[bac_start_y:bac_end_y, bac_start_x:bac_end_x, 1] = (1. - alpha) * im_back[bac_start_y:bac_end_y, bac_start_x:bac_end_x, 1] + alpha * img[top_start_y:top_end_y, top_start_x:top_end_x, 1]
-        im_back[bac_start_y:bac_end_y, bac_start_x:bac_end_x, 2] = (1. - alpha) * im_back[bac_start_y:bac_end_y, bac_start_x:bac_end_x, 2] + alpha * img[top_start_y:top_end_y, top_start_x:top_end_x, 2]
+        # back = (premultiplied + transparency * back) / 255 for all color channels at once in uint16
+        blended = back[:, :, 0:3].astype(np.uint16)
+        blended *= blending['transparency'][top_start_y:top_end_y, top_start_x:top_end_x]
+        blended += blending['premultiplied'][top_start_y:top_end_y, top_start_x:top_end_x]
+        back[:, :, 0:3] = cv2.convertScaleAbs(blended, alpha=1 / 255.)
 
         if im_back.shape[2] == 4:
-            im_back[bac_start_y:bac_end_y, bac_start_x:bac_end_x, 3] = np.maximum(
-                im_back[bac_start_y:bac_end_y, bac_start_x:bac_end_x, 3], alpha * 255)
+            np.maximum(back[:, :, 3], img[top_start_y:top_end_y, top_start_x:top_end_x, 3], out=back[:, :, 3])
             # NOTE unsure if correct alpha blending but results seem fine
         return im_back
 
@@ -1,11 +1,14 @@
 import numpy as np
 import cv2 as cv
 import socket
+import threading
 from functools import partial
-from typing import Tuple
+from typing import List, Optional, Tuple
 import logging
 
 from .ImageHandler import ImageHandler
+from .SharedMapBuffer import SharedMapBuffer
+from .RenderCache import RenderCache
 from ..Configurator import Configurator
 from LabTable.Model.Extent import Extent
 from ..ExtentTracker import ExtentTracker
@@ -13,6 +16,13 @@ from ..ExtentTracker import ExtentTracker
 # Configure Logger
 logger = logging.getLogger(__name__)
 
+# ways the renders of the qgis plugin are handed to the table
+MAP_TRANSPORT_PNG = "png"
+MAP_TRANSPORT_SHARED_MEMORY = "shared_memory"
+
+# xor mask which inverts the color channels of a BGRA image but keeps its alpha channel
+INVERT_COLOR_MASK = (255, 255, 255, 0)
+
 
 # MapHandler class
 # base class for other map related classes
@@ -30,13 +40,19 @@ class MapHandler:
         extent.fit_to_ratio(self.resolution_y / self.resolution_x)
         self.current_extent: Extent = extent
 
-        # initialize two black images
+        # initialize two white images, rendered maps are written into the slot which is currently not displayed
         self.map_image = [
             ImageHandler.ensure_alpha_channel(np.ones((self.resolution_y, self.resolution_x, 3), np.uint8) * 255),
             ImageHandler.ensure_alpha_channel(np.ones((self.resolution_y, self.resolution_x, 3), np.uint8) * 255)
         ]
         self.current_image = 0
 
+        # guards switching the current image against reading it on another thread
+        self.image_lock = threading.Lock()
+
+        # counts the refreshes of the map image
+        self.image_version = 0
+
         self.crs = config.get("map_settings", "coordinate_reference_system")
 
         # set socket & connection info
@@ -50,6 +66,31 @@ class MapHandler:
         self.render_keyword = config.get('qgis_interaction', 'render_keyword')
         self.exit_keyword = config.get('qgis_interaction', 'exit_keyword')
 
+        # renders are either read from png files or from a memory-mapped file with raw pixels
+        self.shared_map_buffer: Optional[SharedMapBuffer] = None
+        self.shared_map_sequence = None
+        if config.get('qgis_interaction', 'map_transport') == MAP_TRANSPORT_SHARED_MEMORY:
+            self.shared_map_buffer = SharedMapBuffer(config.get('qgis_interaction', 'shared_map_path').format(name))
+
+        # renders of recent and prefetched extents, navigating to them shows them before qgis rendered them again
+        # guards writing the unused slot, since cached renders are shown on the main thread
+        self.render_lock = threading.RLock()
+        self.render_cache: Optional[RenderCache] = None
+        self.prefetch_renders = False
+        if config.get('map_settings', 'render_cache_size') > 0:
+            self.render_cache = RenderCache(config.get('map_settings', 'render_cache_size'), self.resolution_x)
+            self.prefetch_renders = config.get('map_settings', 'prefetch_renders')
+
+        # with png files the extent of a render is only known from its notification
+        # so a prefetched render overwriting the file of a requested one would be cached with the wrong extent
+        # in the shared map file every render carries its extent in the header
+        if self.prefetch_renders and self.shared_map_buffer is None:
+            logger.info("renders are only prefetched with the shared memory map transport")
+            self.prefetch_renders = False
+
+        # the extents to prefetch, they are requested one after another since every render overwrites the previous
+        self.prefetch_queue: List[Extent] = []
+
         # set extent modifiers
         pan_up_modifier = np.array([0, 1, 0, 1])
         pan_down_modifier = np.array([0, -1, 0, -1])
@@ -73,25 +114,60 @@ class MapHandler:
         self.zoom_in = partial(self.modify_extent, self.zoom_in_modifier, zoom_strength)
         self.zoom_out = partial(self.modify_extent, self.zoom_out_modifier, zoom_strength)
 
+        # the navigation steps whose target extents are prefetched
+        self.navigation_steps = [
+            (pan_up_modifier, pan_distance),
+            (pan_down_modifier, pan_distance),
+            (pan_left_modifier, pan_distance),
+            (pan_right_modifier, pan_distance),
+            (self.zoom_in_modifier, zoom_strength),
+            (self.zoom_out_modifier, zoom_strength)
+        ]
+
     # reloads the viewport image
     def refresh(self, extent: Extent):
         logger.info("refreshing map")
 
-        unused_slot = (self.current_image + 1) % 2
+        with self.render_lock:
 
-        image = cv.imread(self.image_path.format(self.name), -1)
-        image = ImageHandler.ensure_alpha_channel(image)
+            # the unused slot is not read by other threads, so it can be written without holding the image lock
+            unused_slot = (self.current_image + 1) % 2
 
-        # put image on white background to eliminate issues with 4 channel image display
-        alpha = image[:, :, 3] / 255.0
-        image[:, :, 0] = (1. - alpha) * 255 + alpha * image[:, :, 0]
-        image[:, :, 1] = (1. - alpha) * 255 + alpha * image[:, :, 1]
-        image[:, :, 2] = (1. - alpha) * 255 + alpha * image[:, :, 2]
-        image[:, :, 3] = 255
+            if self.shared_map_buffer is not None:
+
+                shared_render = self.shared_map_buffer.read(partial(self.load_render, unused_slot))
+                if shared_render is None:
+                    return
+
+                # the extent in the header belongs to the pixels, which might already be newer than the notification
+                extent, sequence = shared_render
+                if sequence == self.shared_map_sequence:
+                    return
+                self.shared_map_sequence = sequence
+
+            else:
+                self.load_render(unused_slot, cv.imread(self.image_path.format(self.name), cv.IMREAD_UNCHANGED))
+
+            if self.render_cache is not None:
+                self.render_cache.put(extent, self.map_image[unused_slot])
 
-        # assign image and set slot correctly
-        self.map_image[unused_slot] = image
-        self.current_image = unused_slot
+                # renders which were only prefetched are kept in the cache but not shown
+                if self.render_cache.remove_pending(extent):
+                    logger.debug("cached prefetched render {}".format(extent))
+                    self.request_next_prefetch()
+                    return
+
+            self.show_slot(unused_slot, extent)
+
+        self.prefetch_neighbours(extent)
+
+    # shows the render in the given slot of the double buffer
+    def show_slot(self, slot: int, extent: Extent):
+
+        # set slot correctly
+        with self.image_lock:
+            self.current_image = slot
+            self.image_version += 1
 
         # update extent and set extent changes flag unless extent stayed the same
         if not extent == self.current_extent:
@@ -104,6 +180,80 @@ class MapHandler:
 
         self.config.set("map_settings", 'map_refreshed', True)
 
+    # shows the cached render of the extent if there is one and returns whether it was shown
+    def show_cached_render(self, extent: Extent) -> bool:
+
+        if self.render_cache is None:
+            return False
+
+        image = self.render_cache.get(extent)
+        if image is None:
+            return False
+
+        logger.info("showing cached render")
+        with self.render_lock:
+            unused_slot = (self.current_image + 1) % 2
+            if self.map_image[unused_slot].shape != image.shape:
+                self.map_image[unused_slot] = image.copy()
+            else:
+                np.copyto(self.map_image[unused_slot], image)
+
+            self.show_slot(unused_slot, extent)
+
+        return True
+
+    # queues the extents the navigation steps lead to from the given extent for prefetching
+    # their renders are stored in the cache without being shown
+    def prefetch_neighbours(self, extent: Extent):
+
+        if not self.prefetch_renders:
+            return
+
+        with self.render_lock:
+            self.prefetch_queue = [self.get_modified_extent(extent, extent_modifier, strength)
+                                   for extent_modifier, strength in self.navigation_steps]
+
+        self.request_next_prefetch()
+
+    # requests the render of the next queued extent which is neither cached nor requested yet
+    def request_next_prefetch(self):
+
+        with self.render_lock:
+            while self.prefetch_queue:
+                extent = self.prefetch_queue.pop(0)
+                if self.render_cache.add_pending(extent):
+                    self.send_render_request(extent)
+                    return
+
+    # writes a render into the given slot of the double buffer
+    def load_render(self, slot: int, image):
+
+        if self.map_image[slot].shape[:2] != image.shape[:2]:
+            self.map_image[slot] = np.empty((image.shape[0], image.shape[1], 4), np.uint8)
+
+        # put image on white background to eliminate issues with 4 channel image display
+        MapHandler.flatten_on_white(image, self.map_image[slot])
+
+    # writes an image flattened onto a white background as opaque BGRA image into dst (of the same size)
+    # color on white = 255 - alpha * (255 - color) / 255, so the inverted colors are premultiplied with alpha
+    @staticmethod
+    def flatten_on_white(image, dst):
+
+        if image.shape[2] == 3:
+            cv.cvtColor(image, cv.COLOR_BGR2BGRA, dst=dst)
+
+        # renders without any transparency are copied as they are
+        elif image[:, :, 3].min() == 255:
+            np.copyto(dst, image)
+
+        else:
+            inverted = cv.bitwise_xor(image, INVERT_COLOR_MASK)
+            cv.cvtColor(inverted, cv.COLOR_RGBA2mRGBA, dst=inverted)
+            cv.bitwise_xor(inverted, INVERT_COLOR_MASK, dst=dst)
+            dst[:, :, 3] = 255
+
+        return dst
+
     # gets called whenever the map was refreshed and the extent has changed
     # may carry out different tasks in different subclasses
     def refresh_callback(self):
@@ -114,15 +264,21 @@ class MapHandler:
     # param brick gets ignored so that UIElements can call the function (could however be used to change strength of
     # modification depending on brick type)
     def modify_extent(self, extent_modifier, strength, brick):
-        # get relevant current extent data
-        width, height = self.current_extent.get_size().as_point()
+
+        # request render
+        self.request_render(self.get_modified_extent(self.current_extent, extent_modifier, strength))
+
+    # returns the extent a modifier with the given strength leads to from the given extent within the zoom limits
+    def get_modified_extent(self, extent: Extent, extent_modifier, strength) -> Extent:
+        # get relevant extent data
+        width, height = extent.get_size().as_point()
         dims = np.array([width, height, width, height])
 
         # calculate value change
         move_extent = (extent_modifier * dims) * strength[0]
 
         # apply value change
-        next_extent = self.current_extent.clone()
+        next_extent = extent.clone()
         next_extent.add_extent_modifier(move_extent)
 
         # check if width is below min zoom
@@ -145,15 +301,24 @@ class MapHandler:
                 self.zoom_in_modifier * (change_ratio * change)
             )
 
-        # request render
-        self.request_render(next_extent)
+        return next_extent
 
     # requests a new rendered map extent from qgis plugin
+    # a cached render of the extent is shown right away, the fresh render replaces it when it arrives
     def request_render(self, extent: Extent = None):
 
         if extent is None:
             extent = self.current_extent
 
+        # the render is shown when it arrives, even if the extent was prefetched before
+        if self.render_cache is not None:
+            self.render_cache.remove_pending(extent)
+            self.show_cached_render(extent)
+
+        self.send_render_request(extent)
+
+    # sends a render request for the extent to the qgis plugin
+    def send_render_request(self, extent: Extent):
         self.send(
             '{keyword}{target_name} {required_resolution} {crs} {extent0} {extent1} {extent2} {extent3}'.format(
                 keyword=self.render_keyword, target_name=self.name, required_resolution=self.resolution_x, crs=self.crs,
@@ -167,11 +332,23 @@ class MapHandler:
         logger.debug('sending to qgis: {}'.format(msg))
         self.sock.sendto(msg, self.qgis_addr)
 
-    # returns current map image
-    def get_map_image(self):
-        return self.map_image[self.current_image]
+    # returns a copy of the current map image (written into dst if it has the same shape)
+    # the copy is made while holding the image lock, so a refresh can not switch or overwrite the image meanwhile
+    def get_map_image(self, dst=None):
+
+        with self.image_lock:
+            image = self.map_image[self.current_image]
+
+            if dst is None or dst.shape != image.shape:
+                return image.copy()
 
-    # closes sockets
+            np.copyto(dst, image)
+            return dst
+
+    # closes sockets and the shared map file
     def end(self):
         self.sock.sendto(self.exit_keyword.encode(), self.table_addr)
         self.sock.close()
+
+        if self.shared_map_buffer is not None:
+            self.shared_map_buffer.close()
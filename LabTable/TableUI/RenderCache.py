@@ -0,0 +1,95 @@
+import math
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+import numpy as np
+
+from LabTable.Model.Extent import Extent
+
+# number of zoom levels per halving of the extent width, extents with closer widths share a zoom level
+ZOOM_LEVELS_PER_OCTAVE = 256
+
+# how many prefetched extents per cached image are remembered until their render arrives
+PENDING_PER_CACHED_IMAGE = 4
+
+
+# RenderCache class
+# a bounded least recently used cache of map renders keyed by their quantized extent
+# the extent is quantized to the zoom level and the position in pixels of the render,
+# so extents reached by different navigation paths (e.g. pan left, then pan right) share their render
+#
+# it also remembers the extents which were requested only for prefetching,
+# so the map handler can keep their renders in the cache instead of showing them
+# the cache is used by the main thread (navigation) and the qgis listener thread (renders), so it is locked
+class RenderCache:
+
+    def __init__(self, max_size: int, resolution_x: int):
+
+        self.max_size = max_size
+        self.resolution_x = resolution_x
+
+        self.lock = threading.Lock()
+        self.images: 'OrderedDict[Tuple, np.ndarray]' = OrderedDict()
+        self.pending: 'OrderedDict[Tuple, None]' = OrderedDict()
+
+    # returns the quantized key of an extent: zoom level and position of the upper left corner in pixels
+    def get_key(self, extent: Extent) -> Tuple[int, int, int]:
+
+        pixel_size = extent.get_width() / self.resolution_x
+        zoom_level = round(math.log2(extent.get_width()) * ZOOM_LEVELS_PER_OCTAVE)
+
+        return zoom_level, round(extent.x_min / pixel_size), round(extent.y_max / pixel_size)
+
+    # returns the cached render of the extent or None
+    # cached renders are never modified, they must not be modified by the caller either
+    def get(self, extent: Extent) -> Optional[np.ndarray]:
+
+        key = self.get_key(extent)
+        with self.lock:
+            image = self.images.get(key)
+            if image is not None:
+                self.images.move_to_end(key)
+
+        return image
+
+    # stores a copy of the render of the extent and evicts the least recently used renders
+    def put(self, extent: Extent, image: np.ndarray):
+
+        key = self.get_key(extent)
+        image = image.copy()
+
+        with self.lock:
+            self.images[key] = image
+            self.images.move_to_end(key)
+
+            while len(self.images) > self.max_size:
+                self.images.popitem(last=False)
+
+    # remembers that a render of the extent was requested for prefetching
+    # returns false if the extent is already cached or requested
+    def add_pending(self, extent: Extent) -> bool:
+
+        key = self.get_key(extent)
+        with self.lock:
+            if key in self.images or key in self.pending:
+                return False
+
+            self.pending[key] = None
+            while len(self.pending) > self.max_size * PENDING_PER_CACHED_IMAGE:
+                self.pending.popitem(last=False)
+
+        return True
+
+    # forgets a prefetch request and returns whether the extent was requested only for prefetching
+    def remove_pending(self, extent: Extent) -> bool:
+
+        key = self.get_key(extent)
+        with self.lock:
+            if key not in self.pending:
+                return False
+
+            del self.pending[key]
+            return True
+
+    def __len__(self):
+        return len(self.images)
@@ -0,0 +1,159 @@
+import mmap
+import os
+import struct
+import time
+import logging
+from typing import Callable, Optional, Tuple
+import numpy as np
+
+from LabTable.Model.Extent import Extent
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# header of the shared map file, followed by the raw BGRA pixels (row by row)
+# magic, header version, sequence number, width, height, extent (x_min, y_min, x_max, y_max)
+HEADER_FORMAT = "<4sIQII4d"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+HEADER_MAGIC = b"LLMB"
+HEADER_VERSION = 1
+
+# the pixels start at a 64 byte aligned offset
+PIXEL_OFFSET = 64
+CHANNELS = 4
+
+# offset of the sequence number in the header
+SEQUENCE_OFFSET = 8
+
+# how often a render that is currently written is read again before giving up
+READ_ATTEMPTS = 5
+READ_RETRY_DELAY = 0.002
+
+
+# SharedMapBuffer class
+# a memory-mapped file through which a renderer hands raw BGRA map renders to the table without png encoding
+#
+# the renderer increments the sequence number to an odd value before writing a render and to an even value after it,
+# so a reader can detect renders it read while they were written (and read them again)
+class SharedMapBuffer:
+
+    def __init__(self, path: str):
+        self.path = path
+
+        self.file = None
+        self.buffer: Optional[mmap.mmap] = None
+        self.writable = False
+
+    # returns the size of a shared map file for renders of the given resolution
+    @staticmethod
+    def get_file_size(width: int, height: int) -> int:
+        return PIXEL_OFFSET + width * height * CHANNELS
+
+    # creates (or resizes) the shared map file and maps it for writing renders of the given resolution
+    def open_for_writing(self, width: int, height: int):
+
+        size = SharedMapBuffer.get_file_size(width, height)
+        if self.writable and self.buffer is not None and len(self.buffer) == size:
+            return
+
+        self.close()
+
+        mode = "r+b" if os.path.exists(self.path) else "w+b"
+        self.file = open(self.path, mode)
+        self.file.truncate(size)
+        self.buffer = mmap.mmap(self.file.fileno(), size, access=mmap.ACCESS_WRITE)
+        self.writable = True
+
+        # the sequence number of a new file starts at 0 (nothing written yet)
+        self.buffer[0:HEADER_SIZE] = struct.pack(HEADER_FORMAT, HEADER_MAGIC, HEADER_VERSION, 0, width, height,
+                                                 0., 0., 0., 0.)
+
+    # writes a BGRA render with the extent it shows
+    def write(self, image: np.ndarray, extent: Extent):
+
+        height, width = image.shape[:2]
+        self.open_for_writing(width, height)
+
+        sequence = self.read_sequence()
+
+        # mark the render as being written
+        self.write_sequence(sequence + 1)
+
+        pixels = np.frombuffer(self.buffer, np.uint8, width * height * CHANNELS, PIXEL_OFFSET)
+        np.copyto(pixels.reshape((height, width, CHANNELS)), image)
+        self.buffer[0:HEADER_SIZE] = struct.pack(HEADER_FORMAT, HEADER_MAGIC, HEADER_VERSION, sequence + 1,
+                                                 width, height, extent.x_min, extent.y_min, extent.x_max, extent.y_max)
+
+        # mark the render as complete
+        self.write_sequence(sequence + 2)
+
+    # passes a read only view of the current render to the consume function (which has to copy what it needs)
+    # returns the extent and sequence number of the render or None if no complete render could be read
+    def read(self, consume: Callable[[np.ndarray], None]) -> Optional[Tuple[Extent, int]]:
+
+        for _ in range(READ_ATTEMPTS):
+
+            header = self.read_header()
+            if header is None:
+                return None
+
+            sequence, width, height, extent = header
+
+            # nothing written yet or a render is currently written
+            if sequence == 0 or sequence % 2 == 1:
+                time.sleep(READ_RETRY_DELAY)
+                continue
+
+            if len(self.buffer) < SharedMapBuffer.get_file_size(width, height):
+                self.close()
+                continue
+
+            pixels = np.frombuffer(self.buffer, np.uint8, width * height * CHANNELS, PIXEL_OFFSET)
+            consume(pixels.reshape((height, width, CHANNELS)))
+
+            # the render is only valid if it was not overwritten meanwhile
+            if self.read_sequence() == sequence:
+                return extent, sequence
+
+            time.sleep(READ_RETRY_DELAY)
+
+        logger.warning("could not read a complete render from {}".format(self.path))
+        return None
+
+    # maps the file for reading if necessary and returns the sequence number, resolution and extent of its header
+    def read_header(self) -> Optional[Tuple[int, int, int, Extent]]:
+
+        if self.buffer is None:
+            if not os.path.exists(self.path) or os.path.getsize(self.path) < PIXEL_OFFSET:
+                logger.warning("shared map file {} does not exist".format(self.path))
+                return None
+
+            self.file = open(self.path, "rb")
+            self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.writable = False
+
+        magic, version, sequence, width, height, x_min, y_min, x_max, y_max = \
+            struct.unpack_from(HEADER_FORMAT, self.buffer, 0)
+
+        if magic != HEADER_MAGIC or version != HEADER_VERSION:
+            logger.warning("shared map file {} has an unknown format".format(self.path))
+            return None
+
+        return sequence, width, height, Extent(x_min, y_min, x_max, y_max, True)
+
+    def read_sequence(self) -> int:
+        return struct.unpack_from("<Q", self.buffer, SEQUENCE_OFFSET)[0]
+
+    def write_sequence(self, sequence: int):
+        struct.pack_into("<Q", self.buffer, SEQUENCE_OFFSET, sequence)
+
+    # unmaps and closes the shared map file
+    def close(self):
+
+        if self.buffer is not None:
+            self.buffer.close()
+            self.buffer = None
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
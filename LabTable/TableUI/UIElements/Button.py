@@ -1,4 +1,4 @@
-from ..UIElements.UIElement import UIActionType
+from ..UIElements.UIElement import UIElement, UIActionType
 from ..UIElements.UIStructureBlock import UIStructureBlock
 from ..UICallback import UICallback
 from LabTable.Model.Brick import Brick, BrickStatus
@@ -84,20 +84,32 @@ class Button(UIStructureBlock):
         if self.visible:
 
             if self.pos_on_block(Vector.from_brick(brick)):
-
-                if brick.status == BrickStatus.CANDIDATE_BRICK or brick.status == BrickStatus.INTERNAL_BRICK:
-                    if not self.pressed:
-                        self.call(UIActionType.PRESS, brick)
-                    else:
-                        self.call(UIActionType.HOLD, brick)
-
-                    self.pressed_once = True
-                    self.pressed = True
+                self.handle_brick_on_element(brick)
                 return True
 
             return super().brick_on_element(brick)
         return False
 
+    # executes the callback functions press and hold
+    def handle_brick_on_element(self, brick: Brick):
+
+        if brick.status == BrickStatus.CANDIDATE_BRICK or brick.status == BrickStatus.INTERNAL_BRICK:
+            if not self.pressed:
+                self.call(UIActionType.PRESS, brick)
+                UIElement.appearance_changed()
+            else:
+                self.call(UIActionType.HOLD, brick)
+
+            self.pressed_once = True
+            self.pressed = True
+
+    # the button itself is checked before its children
+    def collect_hit_test_elements(self, elements: List[UIElement], visibilities: List[bool],
+                                  parent_visible: bool = True):
+        elements.append(self)
+        visibilities.append(parent_visible and self.visible)
+        UIElement.collect_hit_test_elements(self, elements, visibilities, parent_visible)
+
     # call once all bricks in a frame have been processed so that e.g. buttons can call their release action
     def ui_tick(self):
 
@@ -105,6 +117,7 @@ class Button(UIStructureBlock):
         if self.pressed and not self.pressed_once:
             self.pressed = False
             self.call(UIActionType.RELEASE, None)
+            UIElement.appearance_changed()
 
         self.pressed_once = False
         super().ui_tick()
@@ -126,15 +139,24 @@ class Button(UIStructureBlock):
             # we want this behavior because then buttons can be used to toggle visibility of menus they are a part of
             self.draw_hierarchy(img)
 
-            # get correct color / icon
-            color = self.color
-            icon = self.icon
-            if self.pressed:
-                color = self.color_pressed
-                icon = self.icon_pressed
-
             # draw the actual button
-            self.draw_background(img, color)
-            if icon is not None:  # draw icon if defined
-                ImageHandler.img_on_background(img, icon, self.get_global_pos().as_point())
-            self.draw_border(img, self.border_color)
+            self.draw_layer(img)
+
+    # draws only the button itself without its children onto an image
+    def draw_element(self, img):
+
+        # get correct color / icon
+        color = self.color
+        icon = self.icon
+        if self.pressed:
+            color = self.color_pressed
+            icon = self.icon_pressed
+
+        self.draw_background(img, color)
+        if icon is not None:  # draw icon if defined
+            ImageHandler.img_on_background(img, icon, self.get_global_pos().as_point())
+        self.draw_border(img, self.border_color)
+
+    # the look of the button also depends on whether it is pressed
+    def get_layer_state(self):
+        return super().get_layer_state() + (self.pressed, self.color_pressed, id(self.icon), id(self.icon_pressed))
@@ -1,3 +1,4 @@
+from .UIElement import UIElement
 from .UIStructureBlock import UIStructureBlock
 from ..MapHandler import MapHandler
 from ..ImageHandler import ImageHandler
@@ -86,26 +87,31 @@ class MiniMap(UIStructureBlock, MapHandler):
 
         return Extent.around_center(center, zoom, self.size.y_per_x())
 
-    # displays this element and all it's children to the given image
-    def draw(self, img):
+    # displays only the mini-map itself without its children to the given image
+    def draw_element(self, img):
 
-        if self.visible:
-            super().draw(img)
+        super().draw_element(img)
+
+        # the map image is drawn while holding the image lock, so a refresh can not switch it meanwhile
+        with self.image_lock:
+            map_dict = {'image': self.map_image[self.current_image]}
+            upper_left = self.get_global_area().get_upper_left().as_point()
+            ImageHandler.img_on_background(img, map_dict, upper_left)
 
-            if self.map_image:
-                map_dict = {'image': self.map_image[self.current_image]}
-                upper_left = self.get_global_area().get_upper_left().as_point()
-                ImageHandler.img_on_background(img, map_dict, upper_left)
+        if self.current_extent.overlapping(self.controlled_map.current_extent):
+            extent_indicator = self.current_extent.cut_extent_on_borders(self.controlled_map.current_extent)
+            extent_indicator = Extent.remap_extent(
+                extent_indicator,
+                self.current_extent,
+                self.get_global_area()
+            )
 
-            if self.current_extent.overlapping(self.controlled_map.current_extent):
-                extent_indicator = self.current_extent.cut_extent_on_borders(self.controlled_map.current_extent)
-                extent_indicator = Extent.remap_extent(
-                    extent_indicator,
-                    self.current_extent,
-                    self.get_global_area()
-                )
+            UIStructureBlock.rectangle(img, extent_indicator, self.extent_color, 1)
 
-                UIStructureBlock.rectangle(img, extent_indicator, self.extent_color, 1)
+    # the look of the mini-map also depends on the map image and both extents
+    def get_layer_state(self):
+        return super().get_layer_state() + (self.image_version, tuple(self.current_extent),
+                                             tuple(self.controlled_map.current_extent))
 
     # checks if a given brick lies on top of the block or any of it's children
     # also initiates a teleport to the specified position
@@ -113,16 +119,27 @@ class MiniMap(UIStructureBlock, MapHandler):
 
         if self.visible:
             if self.pos_on_block(Vector.from_brick(brick)):
-                if brick.status == BrickStatus.CANDIDATE_BRICK or brick.status == BrickStatus.INTERNAL_BRICK:
-                    if not self.pressed:
-                        self.initiate_teleport(brick)
-
-                    self.pressed_once = True
-                    self.pressed = True
+                self.handle_brick_on_element(brick)
                 return True
 
         return False
 
+    # initiates a teleport if the brick was not on the mini-map before
+    def handle_brick_on_element(self, brick: Brick):
+
+        if brick.status == BrickStatus.CANDIDATE_BRICK or brick.status == BrickStatus.INTERNAL_BRICK:
+            if not self.pressed:
+                self.initiate_teleport(brick)
+
+            self.pressed_once = True
+            self.pressed = True
+
+    # only the mini-map itself is checked, not its children
+    def collect_hit_test_elements(self, elements: List[UIElement], visibilities: List[bool],
+                                  parent_visible: bool = True):
+        elements.append(self)
+        visibilities.append(parent_visible and self.visible)
+
     # call once all bricks in a frame have been processed so that e.g. buttons can call their release action
     def ui_tick(self):
 
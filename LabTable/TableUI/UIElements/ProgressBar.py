@@ -72,39 +72,53 @@ class ProgressBar(UIStructureBlock):
             # draw hierarchy
             self.draw_hierarchy(img)
 
-            # get bounds
-            x_min, y_min, x_max, y_max = self.get_global_area()
-            width, height = self.size
+            self.draw_layer(img)
 
-            bar_color, bar_background = self.get_bar_colors()
+    # draws only the bar itself without its children onto an image
+    def draw_element(self, img):
 
-            self.draw_background(img, bar_background, True)
+        # get bounds
+        x_min, y_min, x_max, y_max = self.get_global_area()
+        width, height = self.size
 
-            # if bar should wrap around modify progress
-            progress = self.progress
-            if self.wrap_around:
-                progress = progress % 1
+        bar_color, bar_background = self.get_bar_colors()
 
-            # scale bar down to fit progress
-            if self.horizontal:
-                if self.flipped:
-                    x_min = x_max - width * progress
-                else:
-                    x_max = x_min + width * progress
+        self.draw_background(img, bar_background, True)
 
+        # if bar should wrap around modify progress
+        progress = self.progress
+        if self.wrap_around:
+            progress = progress % 1
+
+        # scale bar down to fit progress
+        if self.horizontal:
+            if self.flipped:
+                x_min = x_max - width * progress
             else:
-                if self.flipped:
-                    y_min = y_max - height * progress
-                else:
-                    y_max = y_min + height * progress
+                x_max = x_min + width * progress
+
+        else:
+            if self.flipped:
+                y_min = y_max - height * progress
+            else:
+                y_max = y_min + height * progress
+
+        cv2.rectangle(img, (int(x_min), int(y_min)), (int(x_max), int(y_max)), bar_color, cv2.FILLED)
+
+        self.draw_border(img, self.border_color)
 
-            cv2.rectangle(img, (int(x_min), int(y_min)), (int(x_max), int(y_max)), bar_color, cv2.FILLED)
+        # show a green circle if the progress is achieved
+        if progress >= 1:
+            self.draw_success(img, self.get_global_pos().as_point(), int(width/2))
 
-            self.draw_border(img, self.border_color)
+    # the look of the bar also depends on the progress
+    def get_layer_state(self):
+        return super().get_layer_state() + (self.progress, self.wrap_around, self.horizontal, self.flipped)
 
-            # show a green circle if the progress is achieved
-            if progress >= 1:
-                self.draw_success(img, self.get_global_pos().as_point(), int(width/2))
+    # the area also includes the success circle above the bar
+    def get_layer_area(self):
+        x_min, y_min, x_max, y_max = super().get_layer_area()
+        return x_min, y_min - OFFSET - self.size.x / 2 - 1, x_max, y_max
 
     # returns the color pf the bar as well as the chosen background
     # (if the bar exceeds 100% and wrap_around is True it wraps around with a new color)
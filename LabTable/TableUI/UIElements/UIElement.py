@@ -7,6 +7,14 @@ from enum import Enum
 # base class for UI element (other than the map itself) the user can interact with
 class UIElement:
 
+    # counts changes of the visibility, position, size and hierarchy of any ui element
+    # results of hit tests can be cached as long as it did not change
+    layout_version = 0
+
+    # counts changes of the look of any ui element (including layout changes)
+    # the drawn ui can be reused as long as it did not change
+    appearance_version = 0
+
     def __init__(self):
         self.position = Vector()    # use set_position to modify
         self.visible: bool = True
@@ -29,6 +37,20 @@ class UIElement:
                     return True
         return False
 
+    # called if a brick lies on this element and on no element which is checked before it
+    # (e.g. buttons call their press action)
+    def handle_brick_on_element(self, brick: Brick):
+        pass
+
+    # appends this element and its children in the order brick_on_element checks them
+    # together with their visibility (an element is only visible if all its parents are)
+    # elements without an area only add their children
+    def collect_hit_test_elements(self, elements: List['UIElement'], visibilities: List[bool],
+                                  parent_visible: bool = True):
+        visible = parent_visible and self.visible
+        for child in self.children:
+            child.collect_hit_test_elements(elements, visibilities, visible)
+
     # call once all bricks in a frame have been processed so that e.g. buttons can call their release action
     def ui_tick(self):
         for child in self.children:
@@ -54,13 +76,28 @@ class UIElement:
     def add_child(self, child):
         self.children.append(child)
         child.parent = self
+        UIElement.layout_changed()
 
     def set_visible(self, visible: bool):
+        if visible != self.visible:
+            UIElement.layout_changed()
         self.visible = visible
 
     # overwrites current position
     def set_position(self, pos: Vector):
         self.position = pos
+        UIElement.layout_changed()
+
+    # call whenever the area covered by ui elements changes
+    @staticmethod
+    def layout_changed():
+        UIElement.layout_version += 1
+        UIElement.appearance_changed()
+
+    # call whenever an ui element will be drawn differently
+    @staticmethod
+    def appearance_changed():
+        UIElement.appearance_version += 1
 
 
 # used for buttons etc
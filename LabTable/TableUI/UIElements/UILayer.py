@@ -0,0 +1,97 @@
+import math
+from typing import Callable, Optional, Tuple
+import numpy as np
+import cv2
+
+
+# UILayer class
+# caches what an ui element draws (without its children) as a BGRA image of the area the element covers
+# the layer is rendered again only if the state the element was drawn with changed
+#
+# the element is drawn once on a black and once on a white scratch frame,
+# the alpha value and the color of every pixel are computed from the difference of both results
+# so the existing draw functions can be reused without knowing about layers
+class UILayer:
+
+    # scratch frames shared by all layers, allocated with the size of the drawn frame
+    scratch_black = None
+    scratch_white = None
+
+    def __init__(self):
+
+        # the state the layer was rendered with
+        self.state = None
+
+        # area of the frame the layer covers (x_min, y_min, x_max, y_max), clipped to the frame
+        self.area: Optional[Tuple[int, int, int, int]] = None
+
+        # mask of the fully opaque pixels and their colors (including the alpha channel the element draws)
+        self.opaque = None
+        self.color = None
+        self.fully_opaque = False
+
+        # partially transparent pixels: their indices, premultiplied colors and transparency
+        self.partial = None
+        self.partial_color = None
+        self.partial_transparency = None
+
+    # returns true if the layer was rendered with the given state for a frame of the given shape
+    def is_valid(self, state, frame_shape) -> bool:
+        return self.state is not None and self.state == (state, frame_shape)
+
+    # renders the layer with a draw function (which draws in frame coordinates) for the given area
+    def render(self, draw_function: Callable, area, frame_shape, state):
+
+        UILayer.ensure_scratch_frames(frame_shape)
+
+        height, width = frame_shape[:2]
+        x_min = min(max(int(math.floor(area[0])), 0), width)
+        y_min = min(max(int(math.floor(area[1])), 0), height)
+        x_max = min(max(int(math.ceil(area[2])), x_min), width)
+        y_max = min(max(int(math.ceil(area[3])), y_min), height)
+        self.area = x_min, y_min, x_max, y_max
+
+        # reset the area on the scratch frames and let the element draw onto both
+        UILayer.scratch_black[y_min:y_max, x_min:x_max] = 0
+        UILayer.scratch_white[y_min:y_max, x_min:x_max] = 255
+        draw_function(UILayer.scratch_black)
+        draw_function(UILayer.scratch_white)
+
+        on_black = UILayer.scratch_black[y_min:y_max, x_min:x_max, 0:3].astype(np.int16)
+        on_white = UILayer.scratch_white[y_min:y_max, x_min:x_max, 0:3].astype(np.int16)
+
+        # on_black = alpha * color, on_white = alpha * color + (1 - alpha) * 255
+        transparency = np.clip((on_white - on_black).max(axis=2), 0, 255)
+
+        self.opaque = (transparency == 0).astype(np.uint8)
+        self.color = UILayer.scratch_black[y_min:y_max, x_min:x_max].copy()
+        self.fully_opaque = bool(self.opaque.all())
+
+        self.partial = np.nonzero((transparency > 0) & (transparency < 255))
+        self.partial_color = on_black[self.partial].astype(np.float32)
+        self.partial_transparency = (transparency[self.partial] / 255.0).astype(np.float32)[:, np.newaxis]
+
+        self.state = (state, frame_shape)
+
+    # draws the layer onto a frame of the shape it was rendered for
+    def draw_on(self, img):
+
+        x_min, y_min, x_max, y_max = self.area
+        region = img[y_min:y_max, x_min:x_max]
+
+        if self.fully_opaque:
+            region[:] = self.color
+        else:
+            cv2.copyTo(self.color, self.opaque, region)
+
+        if self.partial[0].size:
+            region = region[:, :, 0:3]
+            region[self.partial] = self.partial_color + self.partial_transparency * region[self.partial]
+
+    # (re)allocates the scratch frames if the drawn frame has a different shape
+    @staticmethod
+    def ensure_scratch_frames(frame_shape):
+
+        if UILayer.scratch_black is None or UILayer.scratch_black.shape != frame_shape:
+            UILayer.scratch_black = np.zeros(frame_shape, np.uint8)
+            UILayer.scratch_white = np.full(frame_shape, 255, np.uint8)
@@ -2,8 +2,10 @@ from LabTable.Model.Extent import Extent
 from LabTable.Model.Vector import Vector
 from LabTable.Model.Brick import Brick
 from ..UIElements.UIElement import UIElement
+from .UILayer import UILayer
 from ...Configurator import Configurator
 from typing import List
+import math
 import cv2 as cv
 
 
@@ -43,16 +45,45 @@ class UIStructureBlock(UIElement):
         self.border_color = (border_color[0], border_color[1], border_color[2])
         self.show_border = True
 
+        # cached image of the block without its children
+        self.layer = UILayer()
+
     # draws the block onto an image
     def draw(self, img):
 
         if self.visible:
 
-            self.draw_background(img, self.color)
-            self.draw_border(img, self.border_color)
+            self.draw_layer(img)
 
             self.draw_hierarchy(img)
 
+    # draws the cached image of the block, it is only rendered again if the state of the block changed
+    def draw_layer(self, img):
+
+        state = self.get_layer_state()
+        if not self.layer.is_valid(state, img.shape):
+            self.layer.render(self.draw_element, self.get_layer_area(), img.shape, state)
+
+        self.layer.draw_on(img)
+
+    # draws only the block itself without its children onto an image
+    def draw_element(self, img):
+
+        self.draw_background(img, self.color)
+        self.draw_border(img, self.border_color)
+
+    # returns everything the look of the block depends on
+    def get_layer_state(self):
+        return (tuple(self.get_global_area()), self.color, self.border_color, self.border_thickness,
+                self.show_background_color, self.show_border, self.is_ellipse)
+
+    # returns the area the block draws on, including the border
+    def get_layer_area(self):
+        x_min, y_min, x_max, y_max = self.get_global_area()
+        margin = math.ceil(self.border_thickness) + 1
+
+        return x_min - margin, y_min - margin, x_max + margin, y_max + margin
+
     # draws the background of the structure block onto an image
     def draw_background(self, img, color, force=False):
 
@@ -91,6 +122,13 @@ class UIStructureBlock(UIElement):
             return super().brick_would_land_on_element(brick) or self.pos_on_block(Vector.from_brick(brick))
         return False
 
+    # children are checked before the block itself
+    def collect_hit_test_elements(self, elements: List[UIElement], visibilities: List[bool],
+                                  parent_visible: bool = True):
+        super().collect_hit_test_elements(elements, visibilities, parent_visible)
+        elements.append(self)
+        visibilities.append(parent_visible and self.visible)
+
     # checks if any screen coordinate lies on top of
     def pos_on_block(self, pos: Vector) -> bool:
         if self.visible:
@@ -112,12 +150,14 @@ class UIStructureBlock(UIElement):
     def set_size(self, size: Vector):
         self.area = Extent(self.area.get_upper_left(), self.position + size)
         self.size = size
+        UIElement.layout_changed()
 
     # overwrites current area and updates size and position
     def set_area(self, area: Extent):
         self.position = area.get_upper_left
         self.size = area.get_size()
         self.area = area
+        UIElement.layout_changed()
 
     # draws a rectangle using a given area
     @staticmethod
@@ -0,0 +1,66 @@
+from typing import List, Optional
+import numpy as np
+
+from .UIElements.UIElement import UIElement
+
+
+# UIHitIndex class
+# a flat array of the global areas of all ui elements in the order UIElement.brick_on_element checks them
+# together with a mask of the elements which are visible (including all their parents)
+# it is rebuilt only if the ui layout changed and answers for many points at once which element lies under them
+#
+# like UIStructureBlock.pos_on_block, the bounding rectangle of an element is tested (also for ellipses)
+class UIHitIndex:
+
+    def __init__(self, ui_root: UIElement):
+
+        self.ui_root = ui_root
+        self.layout_version = None
+
+        self.elements: List[UIElement] = []
+        self.areas = np.zeros((0, 4))
+        self.visible = np.zeros(0, bool)
+
+    # rebuilds the index if the layout of any ui element changed since the last build
+    def update(self):
+
+        if self.layout_version != UIElement.layout_version:
+
+            elements = []
+            visibilities = []
+            self.ui_root.collect_hit_test_elements(elements, visibilities)
+
+            self.elements = elements
+            self.areas = np.array([tuple(element.get_global_area()) for element in elements],
+                                  dtype=np.float64).reshape(-1, 4)
+            self.visible = np.array(visibilities, dtype=bool)
+            self.layout_version = UIElement.layout_version
+
+    # returns for every point (one x, y row in beamer coordinates) whether it lies on a visible element
+    # and the index of the first visible element it lies on
+    def query(self, points: np.ndarray):
+
+        self.update()
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+        if not self.elements:
+            return np.zeros(len(points), bool), np.zeros(len(points), int)
+
+        x = points[:, 0, np.newaxis]
+        y = points[:, 1, np.newaxis]
+        inside = (self.areas[:, 0] <= x) & (x <= self.areas[:, 2]) \
+            & (self.areas[:, 1] <= y) & (y <= self.areas[:, 3]) & self.visible
+
+        return inside.any(axis=1), inside.argmax(axis=1)
+
+    # returns for every point the first visible element it lies on or None
+    def get_hit_elements(self, points: np.ndarray) -> List[Optional[UIElement]]:
+
+        hit, element_indices = self.query(points)
+        return [self.elements[index] if is_hit else None for is_hit, index in zip(hit, element_indices)]
+
+    # returns for every point whether it lies on any visible element
+    def points_on_elements(self, points: np.ndarray) -> List[bool]:
+
+        hit, _ = self.query(points)
+        return list(hit)
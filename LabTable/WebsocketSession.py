@@ -0,0 +1,199 @@
+import asyncio
+import concurrent.futures
+import itertools
+import json
+import logging
+import ssl
+import threading
+from typing import Dict, List, Optional, Union
+import websockets
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# envelope of requests and answers
+REQUEST_ID_KEY = "request_id"
+MESSAGE_KEY = "message"
+
+
+# WebsocketSession class
+# one long-lived websocket connection to the server, owned by an asyncio event loop running on its own thread
+# requests can be sent from any thread and many requests can be in flight at once
+# with use_envelope each is wrapped in an envelope with a request id and completed by the answer carrying the same id
+# otherwise the bare message is sent and the answers complete the requests in the order they were sent
+# if the connection is lost, pending requests fail and it is established again with an increasing delay
+class WebsocketSession:
+
+    def __init__(
+            self,
+            uri: str,
+            ssl_context: Optional[ssl.SSLContext] = None,
+            request_timeout: float = 10,
+            reconnect_min_delay: float = 0.5,
+            reconnect_max_delay: float = 10,
+            use_envelope: bool = False
+    ):
+        self.uri = uri
+        self.ssl_context = ssl_context
+        self.request_timeout = request_timeout
+        self.reconnect_min_delay = reconnect_min_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.use_envelope = use_envelope
+
+        self.request_ids = itertools.count(1)
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.websocket = None
+        self.closing = False
+
+        self.loop = asyncio.new_event_loop()
+
+        # asyncio primitives bind to the event loop of the thread creating them (before python 3.10)
+        # so they are created in maintain_connection on the session loop
+        # it is scheduled first, so it creates them before any request is sent
+        self.connected: Optional[asyncio.Event] = None
+        self.send_lock: Optional[asyncio.Lock] = None
+        self.thread = threading.Thread(target=self.run_loop, name="websocket session", daemon=True)
+        self.thread.start()
+
+        self.connection_task = asyncio.run_coroutine_threadsafe(self.maintain_connection(), self.loop)
+
+    def run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    # sends a message and blocks until its json answer arrived
+    # raises a ConnectionError if the server can not be reached and a TimeoutError if the answer does not arrive
+    def request(self, message: str) -> Dict:
+        return self.request_async(message).result()
+
+    # sends a message from any thread and returns a future of its json answer
+    def request_async(self, message: str) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(self.send_request(message), self.loop)
+
+    # sends all messages at once and blocks until all answers arrived, so this takes about one round trip
+    # the answer of a failed request is its ConnectionError or TimeoutError
+    def request_all(self, messages: List[str]) -> List[Union[Dict, Exception]]:
+
+        async def send_requests():
+            return await asyncio.gather(*[self.send_request(message) for message in messages],
+                                        return_exceptions=True)
+
+        return asyncio.run_coroutine_threadsafe(send_requests(), self.loop).result()
+
+    async def send_request(self, message: str) -> Dict:
+
+        try:
+            await asyncio.wait_for(self.connected.wait(), self.request_timeout)
+        except asyncio.TimeoutError:
+            raise ConnectionError("not connected to {}".format(self.uri))
+
+        answer = self.loop.create_future()
+        request_id = None
+
+        try:
+            async with self.send_lock:
+                request_id = next(self.request_ids)
+                self.pending[request_id] = answer
+
+                logger.debug("sending message {}: {}".format(request_id, message))
+                if self.use_envelope:
+                    await self.websocket.send(json.dumps({REQUEST_ID_KEY: request_id, MESSAGE_KEY: message}))
+                else:
+                    await self.websocket.send(message)
+
+            return await asyncio.wait_for(answer, self.request_timeout)
+
+        except asyncio.TimeoutError:
+
+            # without envelope a late answer would complete the following request
+            # so the connection is established again to get the answers in order
+            if not self.use_envelope and self.websocket is not None:
+                logger.warning("reconnecting to {} since answers might arrive out of order".format(self.uri))
+                asyncio.ensure_future(self.websocket.close())
+
+            raise TimeoutError("no answer to {} within {} seconds".format(message, self.request_timeout))
+
+        except websockets.exceptions.ConnectionClosed as error:
+            raise ConnectionError("connection to {} closed: {}".format(self.uri, error))
+
+        finally:
+            self.pending.pop(request_id, None)
+
+    # connects to the server and dispatches the answers until the session is closed
+    async def maintain_connection(self):
+
+        self.connected = asyncio.Event()
+
+        # request ids are taken and messages sent under the lock, so without envelope the ids are in sending order
+        self.send_lock = asyncio.Lock()
+
+        delay = self.reconnect_min_delay
+        while not self.closing:
+
+            try:
+                async with websockets.connect(self.uri, ssl=self.ssl_context) as websocket:
+
+                    logger.info("connected to {}".format(self.uri))
+                    self.websocket = websocket
+                    self.connected.set()
+                    delay = self.reconnect_min_delay
+
+                    async for raw_answer in websocket:
+                        self.dispatch(raw_answer)
+
+            except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as error:
+                logger.warning("connection to {} failed: {}".format(self.uri, error))
+
+            finally:
+                self.connected.clear()
+                self.websocket = None
+
+                for answer in self.pending.values():
+                    if not answer.done():
+                        answer.set_exception(ConnectionError("connection to {} lost".format(self.uri)))
+
+            if not self.closing:
+                logger.info("reconnecting to {} in {} seconds".format(self.uri, delay))
+                await asyncio.sleep(delay)
+                delay = min(2 * delay, self.reconnect_max_delay)
+
+    # completes the request an answer belongs to
+    # answers without request id (all answers without envelope) are assigned to the oldest pending request
+    def dispatch(self, raw_answer):
+
+        logger.debug("received message: {}".format(raw_answer))
+
+        # we expect json answers only
+        try:
+            answer = json.loads(raw_answer)
+        except ValueError:
+            logger.warning("received invalid answer: {}".format(raw_answer))
+            return
+
+        # the request id belongs to the envelope, not to the answer
+        request_id = answer.pop(REQUEST_ID_KEY, None) if isinstance(answer, dict) else None
+        # answered requests stay pending until their coroutine resumed, so they are skipped
+        if request_id is None:
+            request_id = min((pending_id for pending_id, pending_answer in self.pending.items()
+                              if not pending_answer.done()), default=None)
+
+        pending_answer = self.pending.get(request_id)
+        if pending_answer is None or pending_answer.done():
+            logger.warning("received answer to unknown request: {}".format(raw_answer))
+            return
+
+        pending_answer.set_result(answer)
+
+    # closes the connection and stops the event loop
+    def close(self):
+
+        async def close_connection():
+            self.closing = True
+            if self.websocket is not None:
+                await self.websocket.close()
+            self.connection_task.cancel()
+
+        if self.thread.is_alive():
+            asyncio.run_coroutine_threadsafe(close_connection(), self.loop).result(self.request_timeout)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(self.request_timeout)
@@ -4,6 +4,7 @@ import numpy as np
 from LabTable.Model.ProgramStage import ProgramStage, CurrentProgramStage
 from .BrickDetection.BoardDetector import BoardDetector
 from .BrickDetection.ShapeDetector import ShapeDetector
+from .BrickDetection.FramePreprocessing import FramePreprocessing
 from .TableInputStream import TableInputStream
 from .TableOutputStream import TableOutputStream, TableOutputChannel
 from .TableUI.MainMap import MainMap
@@ -11,11 +12,13 @@ from .TableUI.CallbackManager import CallbackManager
 from .TableUI.UIElements.UISetup import setup_ui
 from .TableUI.UIElements.UIElement import UIElement
 from .Communicator import Communicator
+from .RemoteCommandQueue import RemoteCommandQueue
 from .BrickDetection.Tracker import Tracker
 from .Configurator import Configurator
 from .ParameterManager import ParameterManager
 from .TableUI.QGISListenerThread import QGISListenerThread
 from .SchedulerThread import SchedulerThread
+from .PerformanceMonitor import PerformanceMonitor
 
 
 # configure logging
@@ -32,6 +35,10 @@ except:
 # region of interest image
 CHANNELS_NUMBER = 3
 
+# program stages which use the depth information of the frames
+# (white balance is included so depth is already captured when the board corners are searched)
+DEPTH_PROGRAM_STAGES = [ProgramStage.WHITE_BALANCE, ProgramStage.FIND_CORNERS]
+
 
 # this class manages the base workflow and handles the main loop
 class LabTable:
@@ -42,6 +49,9 @@ class LabTable:
         self.config = Configurator()
         TableOutputStream.set_beamer_config_info(self.config)
 
+        # Initialize the timing of the main loop stages
+        self.performance_monitor = PerformanceMonitor(self.config)
+
         # create ui root element and callback manager
         ui_root = UIElement()
         self.callback_manager = CallbackManager(self.config)
@@ -61,8 +71,11 @@ class LabTable:
         self.server = Communicator(self.config, self.program_stage)
         self.scenario = self.server.get_scenario_info(self.config.get("general", "scenario"))
 
+        # the tracker creates and removes remote brick instances in the background
+        self.remote_commands = RemoteCommandQueue(self.server, self.config.get("server", "batch_window"))
+
         # Initialize the centroid tracker
-        self.tracker = Tracker(self.config, self.board, self.server, ui_root)
+        self.tracker = Tracker(self.config, self.board, self.remote_commands, ui_root)
         self.callback_manager.set_tracker_callbacks(self.tracker)
 
         # initialize map, map callbacks and ui
@@ -102,13 +115,15 @@ class LabTable:
             self.config,
             self.board,
             self.program_stage,
-            self.server_listener_thread
+            self.server_listener_thread,
+            self.performance_monitor
         )
         self.callback_manager.set_output_actions(self.output_stream)
         self.input_stream = TableInputStream(self.config, self.board, usestream=self.used_stream)
 
-        # initialize the brick detector
+        # initialize the brick detector and the per frame preprocessing it reads from
         self.shape_detector = ShapeDetector(self.config, self.output_stream)
+        self.frame_preprocessing = FramePreprocessing()
 
         # Flag which says whether the bricks
         # stored at the server are already marked as virtual
@@ -117,8 +132,8 @@ class LabTable:
     # Run bricks detection and tracking code
     def run(self):
 
-        # initialize the input stream
-        self.input_stream = TableInputStream(self.config, self.board, usestream=self.used_stream)
+        # start capturing frames of the input stream in the background
+        self.input_stream.start()
 
         # Initialize ROI as a black RGB-image
         region_of_interest = np.zeros((self.config.get("resolution", "height"),
@@ -131,8 +146,18 @@ class LabTable:
             # main loop which handles each frame
             while not self.output_stream.update(self.program_stage):
 
-                # get the next frame
-                depth_image_3d, color_image = self.input_stream.get_frame()
+                # align depth frames only in program stages which use them
+                self.input_stream.set_depth_required(self.program_stage.current_stage in DEPTH_PROGRAM_STAGES)
+
+                # get the latest frame
+                with self.performance_monitor.span("capture"):
+                    color_image = self.input_stream.get_frame()
+                if color_image is None:
+                    if not self.input_stream.is_capturing():
+                        logger.error("the input stream stopped capturing frames")
+                        break
+                    logger.warning("no new frame captured")
+                    continue
 
                 # Add some additional information to the debug window
                 color_image_debug = color_image.copy()
@@ -156,6 +181,9 @@ class LabTable:
                 elif self.program_stage.current_stage == ProgramStage.PLANNING:
                     self.do_brick_detection(region_of_interest, color_image)
 
+                # dump the stage timings from time to time
+                self.performance_monitor.tick()
+
         finally:
             # handle the output stream correctly
             self.output_stream.close()
@@ -165,6 +193,14 @@ class LabTable:
 
             self.main_map.end()
 
+            # send the remaining remote commands and close the connection to the server
+            self.remote_commands.close(self.config.get("server", "request_timeout"))
+            self.server.close()
+
+            # write the stage timings of the last frames
+            if self.performance_monitor.enabled:
+                self.performance_monitor.dump()
+
     def white_balance(self, color_image):
 
         # when finished start next stage with command below
@@ -203,27 +239,30 @@ class LabTable:
         # of interest and start brick detection
 
         # Take only the region of interest from the color image
-        region_of_interest = self.board_detector.rectify_image(region_of_interest, color_image)
+        with self.performance_monitor.span("rectify"):
+            region_of_interest = self.board_detector.rectify_image(region_of_interest, color_image)
         region_of_interest_debug = region_of_interest.copy()
 
         # Initialize brick properties list
         potential_bricks_list = []
 
-        # detect contours in area of interest
-        contours = self.shape_detector.detect_contours(region_of_interest)
+        # compute gray, edges and contours of the area of interest once for all detection stages
+        with self.performance_monitor.span("contour detection"):
+            self.frame_preprocessing.update(region_of_interest)
 
         # Loop over the contours
-        for contour in contours:
+        with self.performance_monitor.span("brick classification"):
+            for contour_index, contour in enumerate(self.frame_preprocessing.contours):
 
-            # Check if the contour is a brick candidate (shape and color can be detected)
-            brick_candidate = self.shape_detector.detect_brick(contour, region_of_interest)
+                # Check if the contour is a brick candidate (shape and color can be detected)
+                brick_candidate = self.shape_detector.detect_brick(contour_index, self.frame_preprocessing)
 
-            if brick_candidate:
-                # Update the properties list of all potential bricks which are found in the frame
-                potential_bricks_list.append(brick_candidate)
+                if brick_candidate:
+                    # Update the properties list of all potential bricks which are found in the frame
+                    potential_bricks_list.append(brick_candidate)
 
-                # mark potential brick contours
-                TableOutputStream.mark_candidates(region_of_interest_debug, contour)
+                    # mark potential brick contours
+                    TableOutputStream.mark_candidates(region_of_interest_debug, contour)
 
         # TODO (future releases) implement this as stage transition callback in ProgramStage
         # Get already stored brick instances from server
@@ -234,14 +273,24 @@ class LabTable:
 
             self.added_stored_bricks_flag = True
 
+        # handle the server answers to the brick instances created and removed in the background
+        if self.remote_commands.apply_results():
+            Tracker.BRICKS_REFRESHED = True
+        self.performance_monitor.set_gauge("pending remote commands", self.remote_commands.get_pending_number())
+
         # Compute tracked bricks dictionary using the centroid tracker and set of properties
         # Mark stored bricks virtual
-        tracked_bricks = self.tracker.update(potential_bricks_list, self.program_stage.current_stage)
+        with self.performance_monitor.span("tracker update"):
+            tracked_bricks = self.tracker.update(potential_bricks_list, self.program_stage.current_stage)
+        self.performance_monitor.set_gauge("tracked candidates", len(self.tracker.tracked_candidates))
 
         # Loop over the tracked objects and label them in the stream
         for tracked_brick in tracked_bricks:
             TableOutputStream.labeling(region_of_interest_debug, tracked_brick)
 
+        # show the stage timings also in the region of interest channel
+        self.output_stream.add_performance_information(region_of_interest_debug)
+
         # write current frame to the stream output
         self.output_stream.write_to_file(region_of_interest_debug)
 